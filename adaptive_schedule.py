@@ -0,0 +1,169 @@
+import os
+import random
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+
+from github_graphql import GRAPHQL_URL, parse_github_time
+from snapshot_store import snapshot_day
+
+# GitHub API points one adaptive run may spend per resource. The fetch workflow runs hourly,
+# so this is the hourly budget; it leaves headroom for the activity stage and other jobs.
+HOURLY_POINT_BUDGET = int(os.getenv("HOURLY_POINT_BUDGET", 2000))
+
+# How often a repo is fetched, by how recently it was pushed to or updated (stars, issues, PRs).
+# Hottest tier first. On top of its interval, every repo is due once it has no snapshot for the
+# current snapshot_date, so dormant repos still get one per calendar day whatever the run start times.
+ACTIVITY_TIERS = [
+    (timedelta(hours=6), timedelta(hours=1)),
+    (timedelta(days=1), timedelta(hours=3)),
+    (timedelta(days=7), timedelta(hours=6)),
+    (None, timedelta(hours=24)),
+]
+
+# Runs do not start on the exact minute, so a repo counts as due slightly early
+SCHEDULE_SLACK = timedelta(minutes=10)
+ACTIVITY_BATCH_SIZE = 100
+
+
+def fetch_interval(last_active, now):
+    for max_age, interval in ACTIVITY_TIERS:
+        if max_age is None or (last_active is not None and now - last_active <= max_age):
+            return interval
+
+
+# How late a repo is, in units of its own interval (due when >= 0). Never-fetched repos come
+# first; a repo without a snapshot for today is due even if its interval has not passed yet.
+def fetch_lateness(last_fetched, interval, now):
+    if last_fetched is None:
+        return float("inf")
+    lateness = (now - last_fetched + SCHEDULE_SLACK) / interval - 1
+    if snapshot_day(last_fetched) != snapshot_day(now):
+        return max(lateness, 0.0)
+    return lateness
+
+
+# Decides which repos are due on each run: active repos come round often, dormant ones daily,
+# and the most overdue (relative to their interval) go first until the point budget is spent.
+class AdaptiveSchedule:
+    def __init__(self, collection, scheduler, token, budget=HOURLY_POINT_BUDGET):
+        self.collection = collection
+        self.scheduler = scheduler
+        self.budget = budget
+        self.headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("repo_id", name="repo_id", unique=True)
+
+    # Last pushedAt/updatedAt of every repo, at one GraphQL point per 100 repos
+    async def fetch_activity(self, repos, session):
+        activity = {}
+        for start in range(0, len(repos), ACTIVITY_BATCH_SIZE):
+            batch = repos[start:start + ACTIVITY_BATCH_SIZE]
+            query = (
+                "query ($ids: [ID!]!) {\n"
+                "  nodes(ids: $ids) { ... on Repository { id pushedAt updatedAt } }\n"
+                "  rateLimit { cost remaining resetAt }\n}"
+            )
+            response = await self.scheduler.request(
+                session, "POST", GRAPHQL_URL, json={"query": query, "variables": {"ids": [repo["repo_id"] for repo in batch]}}, headers=self.headers
+            )
+            result = response.data if response.status == 200 else None
+            if result is None or not result.get("data"):
+                print(f"Failed to fetch repository activity, status: {response.status}")
+                continue
+            for repo, node in zip(batch, result["data"]["nodes"]):
+                if not node:
+                    continue
+                times = [parse_github_time(node["pushedAt"]), parse_github_time(node["updatedAt"])]
+                activity[repo["repo_id"]] = max((time for time in times if time), default=None)
+        return activity
+
+    # Repos to fetch this run, given the estimated points per repo fetch for each API resource.
+    # A dry run plans without storing the refreshed activity.
+    async def plan(self, repos, session, cost_per_repo, now=None, dry_run=False):
+        now = now or datetime.utcnow()
+        activity = await self.fetch_activity(repos, session)
+        entries = {entry["repo_id"]: entry async for entry in self.collection.find({"repo_id": {"$in": [repo["repo_id"] for repo in repos]}})}
+
+        candidates = []
+        updates = []
+        for repo in repos:
+            entry = entries.get(repo["repo_id"], {})
+            last_active = activity.get(repo["repo_id"], entry.get("last_active"))
+            interval = fetch_interval(last_active, now)
+            last_fetched = entry.get("last_fetched_at")
+            updates.append(UpdateOne(
+                {"repo_id": repo["repo_id"]},
+                {"$set": {"repo_name": repo["repo_name"], "last_active": last_active, "interval_hours": interval / timedelta(hours=1)}},
+                upsert=True,
+            ))
+            lateness = fetch_lateness(last_fetched, interval, now)
+            missing_today = last_fetched is None or snapshot_day(last_fetched) != snapshot_day(now)
+            candidates.append((missing_today, lateness, interval, repo))
+        if updates and not dry_run:
+            await self.collection.bulk_write(updates, ordered=False)
+        # Repos still missing today's snapshot go first, so the budget defers same-day re-fetches before them
+        candidates.sort(key=lambda candidate: candidate[:2], reverse=True)
+        candidates = [candidate[1:] for candidate in candidates]
+
+        planned, deferred = [], []
+        spent = {resource: 0.0 for resource in cost_per_repo}
+        # The activity lookup above already used one GraphQL point per batch
+        spent["graphql"] = spent.get("graphql", 0.0) + -(-len(repos) // ACTIVITY_BATCH_SIZE)
+        for lateness, interval, repo in candidates:
+            if lateness < 0:
+                continue
+            if any(spent[resource] + cost > self.budget for resource, cost in cost_per_repo.items()):
+                deferred.append((lateness, interval, repo))
+                continue
+            for resource, cost in cost_per_repo.items():
+                spent[resource] += cost
+            planned.append((lateness, interval, repo))
+
+        # Points per hour if every repo is fetched at its interval
+        steady = {
+            resource: sum(cost / (interval / timedelta(hours=1)) for _, interval, _ in candidates)
+            for resource, cost in cost_per_repo.items()
+        }
+        return {"planned": planned, "deferred": deferred, "cost": spent, "steady_hourly_cost": steady, "repos": len(candidates)}
+
+    # Remember when these repos were fetched, so they are not due again before their interval
+    async def record(self, repo_ids):
+        now = datetime.utcnow()
+        if repo_ids:
+            await self.collection.update_many({"repo_id": {"$in": repo_ids}}, {"$set": {"last_fetched_at": now}})
+
+
+def print_plan(plan, budget=HOURLY_POINT_BUDGET):
+    print(f"Adaptive schedule: {len(plan['planned'])} of {plan['repos']} repositories due, {len(plan['deferred'])} deferred by the budget")
+    for lateness, interval, repo in plan["planned"]:
+        due = "never fetched" if lateness == float("inf") else f"{lateness:.1f} intervals late"
+        print(f"  {repo['repo_name']:<50} every {interval / timedelta(hours=1):>4.0f}h  {due}")
+    for resource, cost in plan["cost"].items():
+        print(f"Projected {resource} cost this run: {cost:.1f} of {budget} points")
+    for resource, cost in plan["steady_hourly_cost"].items():
+        print(f"Projected steady-state {resource} cost: {cost:.1f} points per hour")
+
+
+# Check: over a year of hourly runs with jittered start times, a dormant repo (daily tier)
+# gets a snapshot on every calendar day. Run with `python adaptive_schedule.py`.
+def check_daily_coverage(days=365, max_jitter_minutes=59, seed=0):
+    rng = random.Random(seed)
+    interval = ACTIVITY_TIERS[-1][1]
+    start = datetime(2024, 10, 7)
+    last_fetched = None
+    fetched_days = set()
+    for hour in range(days * 24):
+        now = start + timedelta(hours=hour, minutes=rng.uniform(0, max_jitter_minutes))
+        if fetch_lateness(last_fetched, interval, now) >= 0:
+            # The fetch itself takes a while; record() stores the time it finished
+            last_fetched = now + timedelta(minutes=rng.uniform(0, 5))
+            fetched_days.add(snapshot_day(last_fetched))
+    missed = days - len(fetched_days)
+    print(f"{days} days of hourly runs with up to {max_jitter_minutes} min start jitter: {missed} days without a snapshot")
+    assert missed == 0
+
+
+if __name__ == "__main__":
+    check_daily_coverage(max_jitter_minutes=40)
+    check_daily_coverage(max_jitter_minutes=59)
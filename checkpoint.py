@@ -0,0 +1,119 @@
+import asyncio
+from datetime import datetime
+from pymongo import ASCENDING, UpdateOne
+
+from snapshot_store import METRICS, SnapshotWriter, snapshot_day, stream_snapshots
+
+# Manifests older than this are dropped by MongoDB
+CHECKPOINT_TTL_SECONDS = 30 * 24 * 60 * 60
+
+PENDING = "pending"
+DONE = "done"
+PARTIAL = "partial"
+FAILED = "failed"
+
+
+# Per-day manifest of which repos a fetch run has finished, so an interrupted run can resume
+class RunCheckpoint:
+    def __init__(self, collection, run_date=None):
+        self.collection = collection
+        self.run_date = run_date or snapshot_day(datetime.utcnow())
+
+    async def ensure_indexes(self):
+        await self.collection.create_index(
+            [("run_date", ASCENDING), ("repo_name", ASCENDING)], name="run_date_repo_name", unique=True
+        )
+        await self.collection.create_index(
+            "created_at", name="created_at_ttl", expireAfterSeconds=CHECKPOINT_TTL_SECONDS
+        )
+
+    # Record every repo of the run as pending, keeping the status of repos seen earlier today
+    async def start(self, repo_names):
+        if not repo_names:
+            return
+        now = datetime.utcnow()
+        await self.collection.bulk_write([
+            UpdateOne(
+                {"run_date": self.run_date, "repo_name": repo_name},
+                {"$setOnInsert": {"status": PENDING, "created_at": now, "updated_at": now}},
+                upsert=True,
+            )
+            for repo_name in repo_names
+        ], ordered=False)
+
+    # Repos that already have a complete snapshot for today
+    async def completed(self):
+        cursor = self.collection.find({"run_date": self.run_date, "status": DONE}, {"repo_name": 1})
+        return {entry["repo_name"] async for entry in cursor}
+
+    async def mark(self, repo_names, status):
+        if not repo_names:
+            return
+        await self.collection.update_many(
+            {"run_date": self.run_date, "repo_name": {"$in": list(repo_names)}},
+            {"$set": {"status": status, "updated_at": datetime.utcnow()}},
+        )
+
+    # Mark the snapshots of a flushed batch: complete ones as done, those missing a
+    # metric as partial so --resume fetches them again. Returns the complete snapshots.
+    async def record_flushed(self, batch):
+        complete = [repo_data for repo_data in batch if all(metric in repo_data for metric in METRICS)]
+        partial = [repo_data["repo_name"] for repo_data in batch if not all(metric in repo_data for metric in METRICS)]
+        await self.mark([repo_data["repo_name"] for repo_data in complete], DONE)
+        await self.mark(partial, PARTIAL)
+        return complete
+
+    # Anything still pending once the run has finished did not produce a snapshot
+    async def finish(self):
+        await self.collection.update_many(
+            {"run_date": self.run_date, "status": PENDING},
+            {"$set": {"status": FAILED, "updated_at": datetime.utcnow()}},
+        )
+        counts = self.collection.aggregate([
+            {"$match": {"run_date": self.run_date}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+        ])
+        summary = {entry["_id"]: entry["count"] async for entry in counts}
+        print(f"Run checkpoint for {self.run_date}: {summary}")
+        return summary
+
+
+# Check: a run cancelled part-way (e.g. by the Actions timeout) has already marked the repos it
+# saved as done, so --resume skips them. Needs mongomock; run with `python checkpoint.py`.
+async def check_cancelled_run(repos=60, per_second=40, cancel_after=1.0):
+    from mongomock_async import AsyncCollection
+
+    checkpoint = RunCheckpoint(AsyncCollection())
+    await checkpoint.ensure_indexes()
+    repo_names = [f"owner{i}/repo{i}" for i in range(repos)]
+    await checkpoint.start(repo_names)
+
+    async def fetch(repo_name):
+        await asyncio.sleep(1 / per_second)
+        return {"repo_name": repo_name, "date_fetched": datetime.utcnow(), **{metric: 1 for metric in METRICS}}
+
+    async def on_flush(batch):
+        await checkpoint.record_flushed(batch)
+
+    async def run():
+        async with SnapshotWriter(AsyncCollection(), flush_interval=cancel_after / 4, on_flush=on_flush) as writer:
+            await stream_snapshots([(repo_name,) for repo_name in repo_names], fetch, writer, workers=1)
+
+    task = asyncio.create_task(run())
+    await asyncio.sleep(cancel_after)
+    # What a killed process would leave behind: only the flushes made while it was running
+    done_before_cancel = await checkpoint.completed()
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    done = await checkpoint.completed()
+
+    print(f"Cancelled after {cancel_after}s: {len(done_before_cancel)} of {repos} repositories done before the cancel, {len(done)} after the exit flush")
+    assert 0 < len(done_before_cancel) < repos, "no repositories were marked done while the run was going"
+    assert done_before_cancel <= done
+
+
+if __name__ == "__main__":
+    asyncio.run(check_cancelled_run())
@@ -1,66 +1,40 @@
 import streamlit as st
-import pymongo
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
-
-
-MONGO_URI = st.secrets["MONGO_URI"]
-
-# Set up MongoDB connection
-client = pymongo.MongoClient(MONGO_URI)
-db = client["gssoc"]
-collection = db["repo_stats"]
-
-@st.cache_data
-def load_data():
-    data = list(collection.find({}))
-    df = pd.DataFrame(data)
+from mongo_client import pool_stats
+from incremental_cache import CACHE_TTL_SECONDS
+from dashboard_data import PARQUET_DATASET_PATH, collection, db, load_data, load_repo_index
+from snapshot_queries import find_snapshots, gain_frames_from_df, load_gain_frames
+from timeline import render_timeline
+from leaderboard import REFERENCE_DATE, build_leaderboard, load_leaderboard
+
+
+# Per-repo latest/earliest/day-ago/week-ago rows, aggregated by MongoDB unless reading Parquet
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def load_gains():
+    if PARQUET_DATASET_PATH:
+        return gain_frames_from_df(load_data(), REFERENCE_DATE)
+    return load_gain_frames(collection, REFERENCE_DATE)
+
+
+# Top rows of the leaderboard materialized after the last fetch, computed live if it is missing
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def load_top_leaderboard(period, top_n=10):
+    df = load_leaderboard(db, period, top_n)
+    if df.empty:
+        df = build_leaderboard(load_gains(), period).head(top_n)
     return df
 
 
-def calculate_gains(df, period='overall'):
-    metrics = ["stars", "forks", "watchers", "contributors", "closed_prs"]
-   
-    # Set reference date to October 7th of the current year
-    reference_date = datetime(datetime.now().year, 10, 7)
-   
-    # Calculate days since reference date for each entry
-    df['days_since_reference'] = (df['date_fetched'] - reference_date).dt.days
-   
-    if period == 'overall':
-        latest_df = df.sort_values('days_since_reference').groupby('repo_name').last()
-        earliest_df = df.sort_values('days_since_reference').groupby('repo_name').first()
-        for metric in metrics:
-            latest_df[f"{metric}_gain"] = latest_df[metric] - earliest_df[metric]
-    elif period == 'daily':
-        latest_df = df.sort_values('days_since_reference').groupby('repo_name').last()
-        one_day_ago_df = df[df['days_since_reference'] == latest_df['days_since_reference'].max() - 1].groupby('repo_name').last()
-        for metric in metrics:
-            latest_df[f"{metric}_daily_gain"] = latest_df[metric] - one_day_ago_df[metric]
-    elif period == 'weekly':
-        latest_df = df.sort_values('days_since_reference').groupby('repo_name').last()
-        week_ago_df = df[df['days_since_reference'] >= latest_df['days_since_reference'].max() - 7].groupby('repo_name').first()
-        for metric in metrics:
-            latest_df[f"{metric}_weekly_gain"] = latest_df[metric] - week_ago_df[metric]
-   
-    return latest_df.reset_index()
-
-
-def calculate_composite_score(df):
-    metrics = ["forks", "contributors", "closed_prs", "stars", "watchers"]
-    for metric in metrics:
-        df[f"{metric}_gain_percentile"] = df[f"{metric}_gain"].rank(pct=True)
-   
-    high_weight = 0.7 * (df["forks_gain_percentile"] + df["contributors_gain_percentile"] + df["closed_prs_gain_percentile"]) / 3
-    low_weight = 0.3 * (df["stars_gain_percentile"] + df["watchers_gain_percentile"]) / 2
-    return high_weight + low_weight
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def load_repo_history(repo_name):
+    if PARQUET_DATASET_PATH:
+        return load_repo_index().history(repo_name)
+    return find_snapshots(collection, repo_name=repo_name)
 
 
 def display_leaderboard(df, period):
     if period == 'Overall':
-        df['composite_score'] = calculate_composite_score(df)
         display_df = df[['repo_name', 'composite_score'] + [f"{m}_gain" for m in ["stars", "forks", "watchers", "contributors", "closed_prs"]]].sort_values('composite_score', ascending=False).head(10).reset_index()
         fig = px.bar(display_df, x="repo_name", y="composite_score", title="Top 10 Overall")
     else:
@@ -73,31 +47,24 @@ def display_leaderboard(df, period):
     st.plotly_chart(fig)
 
 
-def display_repo_timeline(df, repo_name):
-    project_df = df[df['repo_name'] == repo_name].sort_values('date_fetched')
-   
+# project_df holds one repo's snapshots, oldest first
+def display_repo_timeline(project_df, repo_name):
     st.subheader("Current Stats")
     col1, col2, col3 = st.columns(3)
     col1.metric("Stars", project_df['stars'].iloc[-1])
     col2.metric("Forks", project_df['forks'].iloc[-1])
     col3.metric("Contributors", project_df['contributors'].iloc[-1])
    
-    st.subheader("Trends over Time")
     metrics = ['stars', 'forks', 'watchers', 'contributors', 'open_issues', 'closed_issues', 'open_prs', 'closed_prs']
-    for metric in metrics:
-        fig = px.line(project_df, x='date_fetched', y=metric, title=f"{metric.capitalize()} over Time")
-        st.plotly_chart(fig)
+    render_timeline(project_df, metrics, key=repo_name)
 
 
-def compare_repos(df, repos):
+def compare_repos(latest_data, repos):
     metrics = ['stars', 'forks', 'watchers', 'contributors', 'closed_prs']
-    latest_data = df.sort_values('date_fetched').groupby('repo_name').last().reset_index()
    
-    data = []
-    for repo in repos:
-        repo_data = latest_data[latest_data['repo_name'] == repo]
-        if not repo_data.empty:
-            data.append([repo] + [repo_data[metric].values[0] for metric in metrics])
+    # latest_data is indexed by repo_name, so this is a lookup per selected repo rather than a scan
+    selected = latest_data.loc[[repo for repo in repos if repo in latest_data.index], metrics]
+    data = [[repo] + list(values) for repo, values in zip(selected.index, selected.to_numpy())]
    
     fig = go.Figure()
     for d in data:
@@ -125,7 +92,8 @@ def main():
     st.set_page_config(page_title="GSSoC 2024 Dashboard", page_icon="GS_logo_White.svg", layout="wide")
     st.markdown("<br>", unsafe_allow_html=True)
     st.image("GS_logo_White.svg", width=500)   
-    raw_df = load_data()
+    gain_frames = load_gains()
+    latest_df = gain_frames['latest'].reset_index()
    
     tab1, tab2, tab3 = st.tabs(["## Leaderboard", "## Per Repo Timeline", "## Compare Repos"])
    
@@ -133,23 +101,27 @@ def main():
         st.header("Leaderboard")
         period = st.radio("Select period", ["Overall", "Day", "Week"], horizontal=True)
         if period == "Overall":
-            df = calculate_gains(raw_df, 'overall')
+            df = load_top_leaderboard('overall')
         elif period == "Day":
-            df = calculate_gains(raw_df, 'daily')
+            df = load_top_leaderboard('daily')
         else:
-            df = calculate_gains(raw_df, 'weekly')
+            df = load_top_leaderboard('weekly')
         display_leaderboard(df, period)
    
     with tab2:
         st.header("Per Repo Timeline")
-        selected_project = st.selectbox("Select a project", raw_df['repo_name'].unique())
-        display_repo_timeline(raw_df, selected_project)
+        selected_project = st.selectbox("Select a project", latest_df['repo_name'])
+        display_repo_timeline(load_repo_history(selected_project), selected_project)
    
     with tab3:
         st.header("Compare Repos")
-        repos = st.multiselect("Select repositories to compare", raw_df['repo_name'].unique())
+        repos = st.multiselect("Select repositories to compare", latest_df['repo_name'])
         if repos:
-            compare_repos(raw_df, repos)
+            compare_repos(gain_frames['latest'], repos)
+
+    if st.secrets.get("SHOW_POOL_STATS", False):
+        with st.sidebar.expander("MongoDB connection pool"):
+            st.json(pool_stats())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,60 @@
+import streamlit as st
+from mongo_client import get_database
+from incremental_cache import IncrementalSnapshotCache, snapshot_source, snapshot_version
+from repo_index import RepoIndex
+from gains import compute_gains
+from scoring import composite_score, snapshot_days
+
+# Snapshot loading shared by the dashboards, so every page reads the same cached frame
+
+# MongoDB connection, pooled and shared across sessions
+db = get_database()
+collection = db["repo_stats"]
+
+# Optional date-partitioned Parquet export of repo_stats, read instead of scanning MongoDB
+PARQUET_DATASET_PATH = st.secrets.get("PARQUET_DATASET_PATH")
+
+
+# Snapshot frame kept across reruns and sessions, topped up with new snapshots on a TTL
+# and reloaded when a repo rename rewrites stored snapshots
+@st.cache_resource
+def get_snapshot_cache():
+    return IncrementalSnapshotCache(
+        snapshot_source(collection, PARQUET_DATASET_PATH),
+        version=snapshot_version(collection, PARQUET_DATASET_PATH),
+    )
+
+
+def load_data():
+    df, _, _ = get_snapshot_cache().get()
+    return df
+
+
+# Per-repo slices of the raw snapshot frame
+def load_repo_index():
+    df, high_water_mark, data_version = get_snapshot_cache().get()
+    return build_repo_index(df, high_water_mark, data_version, "snapshots")
+
+
+# Snapshots with a same-day composite score and every gain column, best score first,
+# plus the repo index over that frame
+def load_scored_data(weights):
+    snapshots, high_water_mark, data_version = get_snapshot_cache().get()
+    df = prepare_data(snapshots, high_water_mark, data_version, weights)
+    return df, build_repo_index(df, high_water_mark, data_version, tuple(weights))
+
+
+# Per-repo slices of a frame, rebuilt only when the high-water mark moves or a rename reloads
+# the snapshots; `frame_key` tells apart the different frames indexed at the same mark
+@st.cache_resource(max_entries=1)
+def build_repo_index(_df, high_water_mark, data_version, frame_key):
+    return RepoIndex(_df)
+
+
+# Derived columns are recomputed only when the high-water mark moves or the data version changes
+@st.cache_data(max_entries=1)
+def prepare_data(_snapshots, high_water_mark, data_version, weights):
+    # Composite score from percentile ranks among the repos fetched the same day
+    df = _snapshots.assign(composite_score=composite_score(_snapshots, weights, by=snapshot_days(_snapshots)))
+    df = compute_gains(df)
+    return df.sort_values(by="composite_score", ascending=False)
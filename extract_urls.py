@@ -1,11 +1,14 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
+import json
 import pymongo
 import logging
+import argparse
+import requests
+from lxml import html
 from dotenv import load_dotenv
-import time
 import os
 
+from github_urls import dedupe_projects, parse_github_url
+
 load_dotenv()
 
 MONGO_URI = os.getenv('MONGO_URI')
@@ -13,68 +16,167 @@ MONGO_URI = os.getenv('MONGO_URI')
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # MongoDB connection (optional if you want to store the data)
-client = pymongo.MongoClient('MONGO_URI')
+client = pymongo.MongoClient(MONGO_URI)
 db = client["gssoc"]
 projects_collection = db["projects"]
-driver = webdriver.Chrome()
 
 # GSSoC project page URL
 url = 'https://gssoc.girlscript.tech/project'
 
+# How long to wait for the project cards to render
+PAGE_LOAD_TIMEOUT = 30
+
+# One div per project card, each with the linked project name and its tag buttons
+PROJECT_CARDS_XPATH = '//*[@id="__next"]/div/section/div[2]/div[4]/div'
+PROJECT_LINK_XPATH = './/div/div/div[1]/div[1]/a'
+PROJECT_TAGS_XPATH = './/div/div/div[2]/button'
+
+# Read every card in a single round trip to the browser instead of several lookups per field
+EXTRACT_CARDS_SCRIPT = """
+const [cardsXPath, linkXPath, tagsXPath] = arguments;
+const snapshot = (xpath, node) => document.evaluate(xpath, node, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+const cards = snapshot(cardsXPath, document);
+const projects = [];
+for (let i = 0; i < cards.snapshotLength; i++) {
+    const card = cards.snapshotItem(i);
+    const link = snapshot(linkXPath, card).snapshotItem(0);
+    const tags = snapshot(tagsXPath, card);
+    projects.push({
+        name: link ? link.innerText.trim() : null,
+        href: link ? link.href : null,
+        tags: Array.from({length: tags.snapshotLength}, (_, j) => tags.snapshotItem(j).innerText.trim() || "No tag"),
+    });
+}
+return projects;
+"""
+
+
+# Selenium is only imported for the browser path, so the static extractor runs without it
+def create_driver(headless=True):
+    from selenium import webdriver
+
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless=new")
+        options.add_argument("--disable-gpu")
+        options.add_argument("--no-sandbox")
+    return webdriver.Chrome(options=options)
+
+
 # Function to scrape GSSoC projects
-def scrape_gssoc_projects():
-    driver.get(url)
-    time.sleep(5)  # Wait for the page to load fully (increase this time if necessary)
-    
-    project_data = []
+def scrape_gssoc_projects(driver, page_url=url, timeout=PAGE_LOAD_TIMEOUT):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions
+    from selenium.webdriver.support.ui import WebDriverWait
 
-    # Find all project divs
-    project_divs = driver.find_elements(By.XPATH, '//*[@id="__next"]/div/section/div[2]/div[4]/div')
-    
-    for i, project_div in enumerate(project_divs, start=1):
-        try:
-            # Extract the project name
-            project_name = project_div.find_element(By.XPATH, './/div/div/div[1]/div[1]/a').text.strip()
-            
-            # Extract the GitHub URL
-            github_url = project_div.find_element(By.XPATH, './/div/div/div[1]/div[1]/a').get_attribute('href')
-            
-            # Extract the project tag
-            tag_elements = project_div.find_elements(By.XPATH, './/div/div/div[2]/button')
-            tags = []
-            for tag_element in tag_elements:
-                tags.append(tag_element.text.strip() if tag_element else "No tag")
-            
-            # Prepare project info
-            project_info = {
-                "project_name": project_name.split(". ")[1],
-                "github_url": github_url,
-                "tags": tags
-            }
-            
-            # Print the extracted data
-            print(project_info)
-            
-            # Optional: Store the data in MongoDB
-            projects_collection.update_one(
-                {"github_url": github_url}, 
-                {"$set": project_info}, 
-                upsert=True
-            )
-            
-            project_data.append(project_info)
-        
-        except Exception as e:
-            print(f"Error parsing project {i}: {e}")
-    
+    driver.get(page_url)
+    WebDriverWait(driver, timeout).until(
+        expected_conditions.presence_of_all_elements_located((By.XPATH, PROJECT_CARDS_XPATH))
+    )
+    cards = driver.execute_script(EXTRACT_CARDS_SCRIPT, PROJECT_CARDS_XPATH, PROJECT_LINK_XPATH, PROJECT_TAGS_XPATH)
+
+    project_data = []
+    for i, card in enumerate(cards, start=1):
+        if not card["name"] or not card["href"]:
+            print(f"Error parsing project {i}: missing project link")
+            continue
+        project_data.append({
+            # Card titles are numbered, e.g. "12. Project Name"
+            "project_name": card["name"].split(". ", 1)[-1],
+            "github_url": card["href"],
+            "tags": card["tags"],
+        })
     return project_data
 
-# Run the scraper
-scraped_projects = scrape_gssoc_projects()
 
-# Optional: Close the driver after scraping
-driver.quit()
+# Keys the project records in the page data may use for each field
+PROJECT_NAME_KEYS = ("project_name", "projectName", "name", "title")
+PROJECT_URL_KEYS = ("github_url", "githubUrl", "github", "repo", "repository", "link", "url")
+PROJECT_TAG_KEYS = ("tags", "techStack", "tech_stack", "technologies", "stack")
+
+
+# Tag names from a comma-separated string or a list of strings / {name} or {label} objects;
+# anything else in the list (numbers, nulls, objects without a name) is skipped
+def tag_names(tags):
+    if isinstance(tags, str):
+        return [tag.strip() for tag in tags.split(",") if tag.strip()]
+    if not isinstance(tags, list):
+        return []
+    names = []
+    for tag in tags:
+        if isinstance(tag, dict):
+            tag = tag.get("name") or tag.get("label")
+        if isinstance(tag, str) and tag.strip():
+            names.append(tag.strip())
+    return names
+
+
+# Walk the page data for records that carry a project name and a GitHub repository URL
+def find_projects(data):
+    if isinstance(data, list):
+        for item in data:
+            yield from find_projects(item)
+    elif isinstance(data, dict):
+        github_url = next((data[key] for key in PROJECT_URL_KEYS if isinstance(data.get(key), str) and parse_github_url(data[key])), None)
+        project_name = next((data[key] for key in PROJECT_NAME_KEYS if isinstance(data.get(key), str)), None)
+        if github_url and project_name:
+            tags = next((data[key] for key in PROJECT_TAG_KEYS if key in data), [])
+            yield {"project_name": project_name.split(". ", 1)[-1].strip(), "github_url": github_url, "tags": tag_names(tags)}
+            return
+        for value in data.values():
+            yield from find_projects(value)
+
+
+# Same output as scrape_gssoc_projects, read from the page's embedded Next.js data
+# (or a JSON API response) with a plain HTTP request instead of a browser
+def scrape_gssoc_projects_static(page_url=url, timeout=PAGE_LOAD_TIMEOUT):
+    response = requests.get(page_url, timeout=timeout)
+    response.raise_for_status()
+    if "json" in response.headers.get("Content-Type", ""):
+        data = response.json()
+    else:
+        next_data = html.fromstring(response.content).xpath('//script[@id="__NEXT_DATA__"]/text()')
+        if not next_data:
+            raise ValueError(f"No __NEXT_DATA__ found in {page_url}")
+        data = json.loads(next_data[0])
+    return list(find_projects(data))
+
+
+# Upsert scraped projects in one bulk_write, skipping those already stored unchanged
+def save_projects(projects):
+    existing = {
+        project["github_url"]: project
+        for project in projects_collection.find({}, {"_id": 0, "project_name": 1, "github_url": 1, "tags": 1})
+    }
+    updates = [
+        pymongo.UpdateOne({"github_url": project["github_url"]}, {"$set": project}, upsert=True)
+        for project in projects
+        if existing.get(project["github_url"]) != project
+    ]
+    if updates:
+        projects_collection.bulk_write(updates, ordered=False)
+    print(f"Scraped {len(projects)} projects: {len(updates)} new or changed, {len(projects) - len(updates)} unchanged")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape the GSSoC project list into MongoDB")
+    parser.add_argument("--url", default=url, help="Project page to scrape, e.g. a saved copy served locally")
+    parser.add_argument("--static", action="store_true", help="Parse the page's embedded data without starting a browser")
+    parser.add_argument("--show-browser", action="store_true", help="Run Chrome with a visible window")
+    parser.add_argument("--dry-run", action="store_true", help="Print the scraped projects without saving them")
+    args = parser.parse_args()
+
+    if args.static:
+        scraped_projects = scrape_gssoc_projects_static(args.url)
+    else:
+        driver = create_driver(headless=not args.show_browser)
+        try:
+            scraped_projects = scrape_gssoc_projects(driver, args.url)
+        finally:
+            driver.quit()
+    scraped_projects = dedupe_projects(scraped_projects)
 
-# Optional: Display the collected data
-for project in scraped_projects:
-    print(project)
\ No newline at end of file
+    for project in scraped_projects:
+        print(project)
+    if not args.dry_run:
+        save_projects(scraped_projects)
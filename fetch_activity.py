@@ -0,0 +1,197 @@
+import os
+import argparse
+import aiohttp
+import asyncio
+import pymongo
+import motor.motor_asyncio
+from datetime import datetime
+from dotenv import load_dotenv
+from github_graphql import GRAPHQL_URL, parse_github_time
+from github_scheduler import GitHubScheduler
+from repo_registry import SNAPSHOT_COLLECTIONS, RepoRegistry
+
+load_dotenv()
+
+GITHUB_API_TOKEN = os.getenv('GH_TOKEN')
+MONGODB_URI = os.getenv('MONGO_URI')
+
+# MongoDB setup
+client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URI)
+db = client["gssoc"]
+projects_collection = db["projects"]
+events_collection = db["activity_events"]
+sync_collection = db["activity_sync"]
+
+# Shared scheduler bounding in-flight requests and pacing them against rate limits
+scheduler = GitHubScheduler()
+
+# Project URLs resolved to stable repo ids and canonical names, following renames
+registry = RepoRegistry(db["repo_registry"], scheduler, GITHUB_API_TOKEN, [db[name] for name in SNAPSHOT_COLLECTIONS])
+
+PAGE_SIZE = 100
+MAX_LABELS = 20
+
+# Pull requests and issues are walked newest-updated first with cursors, so an incremental
+# run stops at the first node it has already seen instead of paging through the whole history.
+# Connection cursors also avoid the 1,000 result cap of the search API.
+ACTIVITY_QUERIES = {
+    "pull_request": """
+    query ($owner: String!, $repo: String!, $cursor: String) {
+      repository(owner: $owner, name: $repo) {
+        items: pullRequests(first: %d, after: $cursor, orderBy: {field: UPDATED_AT, direction: DESC}) {
+          pageInfo { hasNextPage endCursor }
+          nodes {
+            id number title state createdAt updatedAt closedAt mergedAt additions deletions
+            author { login }
+            labels(first: %d) { nodes { name } }
+          }
+        }
+      }
+      rateLimit { cost remaining resetAt }
+    }
+    """ % (PAGE_SIZE, MAX_LABELS),
+    "issue": """
+    query ($owner: String!, $repo: String!, $cursor: String, $since: DateTime) {
+      repository(owner: $owner, name: $repo) {
+        items: issues(first: %d, after: $cursor, orderBy: {field: UPDATED_AT, direction: DESC}, filterBy: {since: $since}) {
+          pageInfo { hasNextPage endCursor }
+          nodes {
+            id number title state createdAt updatedAt closedAt
+            author { login }
+            labels(first: %d) { nodes { name } }
+          }
+        }
+      }
+      rateLimit { cost remaining resetAt }
+    }
+    """ % (PAGE_SIZE, MAX_LABELS),
+}
+
+
+# Activity is keyed by the registry's repo_id, which survives renames. Watermarks from before
+# that (keyed by repo_name) are dropped along with their indexes, so each repo is walked in
+# full once more and every stored event gets its repo_id.
+async def ensure_activity_indexes():
+    for collection, legacy_index in [(events_collection, "repo_name_1_kind_1_updated_at_-1"), (sync_collection, "repo_name_1_kind_1")]:
+        if legacy_index in await collection.index_information():
+            await collection.drop_index(legacy_index)
+    await sync_collection.delete_many({"repo_id": {"$exists": False}})
+    await events_collection.create_index("node_id", unique=True)
+    await events_collection.create_index([("repo_id", pymongo.ASCENDING), ("kind", pymongo.ASCENDING), ("updated_at", pymongo.DESCENDING)])
+    await events_collection.create_index([("author", pymongo.ASCENDING), ("kind", pymongo.ASCENDING), ("merged_at", pymongo.DESCENDING)])
+    await sync_collection.create_index([("repo_id", pymongo.ASCENDING), ("kind", pymongo.ASCENDING)], unique=True)
+
+
+def build_event(repo, kind, node):
+    return {
+        "node_id": node["id"],
+        "repo_id": repo["repo_id"],
+        "repo_name": repo["repo_name"],
+        "kind": kind,
+        "number": node["number"],
+        "title": node["title"],
+        "state": node["state"],
+        "author": node["author"]["login"] if node["author"] else None,
+        "labels": [label["name"] for label in node["labels"]["nodes"]],
+        "created_at": parse_github_time(node["createdAt"]),
+        "updated_at": parse_github_time(node["updatedAt"]),
+        "closed_at": parse_github_time(node["closedAt"]),
+        "merged_at": parse_github_time(node.get("mergedAt")),
+        "additions": node.get("additions"),
+        "deletions": node.get("deletions"),
+    }
+
+
+# Last updatedAt synced per (repo_id, kind), kept as GitHub's own ISO string
+async def load_watermarks():
+    watermarks = {}
+    async for sync in sync_collection.find({}, {"_id": 0, "repo_id": 1, "kind": 1, "updated_at": 1}):
+        watermarks[(sync["repo_id"], sync["kind"])] = sync["updated_at"]
+    return watermarks
+
+
+async def save_events(events):
+    if not events:
+        return
+    updates = [pymongo.UpdateOne({"node_id": event["node_id"]}, {"$set": event}, upsert=True) for event in events]
+    await events_collection.bulk_write(updates, ordered=False)
+
+
+# Page through one repo's pull requests or issues until reaching nodes older than the watermark.
+# Events are saved page by page; the watermark only moves once the whole walk has finished,
+# so an interrupted run picks up the same window again next time.
+async def sync_repo_activity(repo, kind, watermark, session):
+    repo_name = repo["repo_name"]
+    headers = {
+        "Authorization": f"Bearer {GITHUB_API_TOKEN}",
+        "Content-Type": "application/json"
+    }
+    owner, name = repo_name.split("/")
+    variables = {"owner": owner, "repo": name, "cursor": None}
+    if kind == "issue":
+        variables["since"] = watermark
+
+    newest = None
+    saved = 0
+    while True:
+        response = await scheduler.request(session, "POST", GRAPHQL_URL, json={"query": ACTIVITY_QUERIES[kind], "variables": variables}, headers=headers)
+        result = response.data if response.status == 200 else None
+        if result is None or not result.get("data") or not result["data"].get("repository"):
+            reason = f"status: {response.status}" if result is None else result.get("errors")
+            print(f"Failed to fetch {kind} activity for {repo_name}, {reason}")
+            return saved
+
+        items = result["data"]["repository"]["items"]
+        nodes = [node for node in items["nodes"] if watermark is None or node["updatedAt"] > watermark]
+        if nodes and newest is None:
+            newest = nodes[0]["updatedAt"]
+        await save_events([build_event(repo, kind, node) for node in nodes])
+        saved += len(nodes)
+
+        if len(nodes) < len(items["nodes"]) or not items["pageInfo"]["hasNextPage"]:
+            break
+        variables["cursor"] = items["pageInfo"]["endCursor"]
+
+    if newest is not None:
+        await sync_collection.update_one(
+            {"repo_id": repo["repo_id"], "kind": kind},
+            {"$set": {"repo_name": repo_name, "updated_at": newest, "synced_at": datetime.utcnow()}},
+            upsert=True,
+        )
+    # Events saved before a rename keep the old name until they are updated again
+    await events_collection.update_many(
+        {"repo_id": repo["repo_id"], "kind": kind, "repo_name": {"$ne": repo_name}},
+        {"$set": {"repo_name": repo_name}},
+    )
+    print(f"Synced {saved} new or updated {kind}s for {repo_name}")
+    return saved
+
+
+async def fetch_all_activity(full=False):
+    projects = await projects_collection.find({}, {"project_name": 1, "github_url": 1}).to_list(None)
+    await ensure_activity_indexes()
+    await registry.ensure_indexes()
+    watermarks = {} if full else await load_watermarks()
+
+    async with aiohttp.ClientSession() as session:
+        resolved = await registry.resolve(projects, session)
+        repos = sorted(resolved, key=lambda repo: repo["repo_name"])
+        tasks = [
+            sync_repo_activity(repo, kind, watermarks.get((repo["repo_id"], kind)), session)
+            for repo in repos
+            for kind in ACTIVITY_QUERIES
+        ]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    for task_result in results:
+        if isinstance(task_result, Exception):
+            print(f"Activity sync failed: {task_result!r}")
+    print(f"Saved {sum(r for r in results if not isinstance(r, Exception))} activity events for {len(repos)} repositories")
+    scheduler.report()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch pull request and issue activity for all GSSoC projects")
+    parser.add_argument("--full", action="store_true", help="Ignore the stored watermarks and walk every repo's full history")
+    args = parser.parse_args()
+    asyncio.run(fetch_all_activity(full=args.full))
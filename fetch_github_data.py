@@ -3,10 +3,20 @@ import asyncio
 import pymongo
 from gql import gql, Client
 from gql.transport.aiohttp import AIOHTTPTransport
+from gql.transport.exceptions import TransportQueryError, TransportServerError
+from graphql import build_schema, get_introspection_query, graphql_sync, print_schema
 import os
+import json
+import time
+import argparse
+import tempfile
 import datetime
 import motor.motor_asyncio
 from dotenv import load_dotenv
+from github_graphql import GRAPHQL_URL
+from github_scheduler import GitHubScheduler, RETRY_STATUSES
+from repo_registry import SNAPSHOT_COLLECTIONS, RepoRegistry, with_repo_ids
+from snapshot_store import SnapshotWriter, ensure_snapshot_indexes, stream_snapshots
 
 load_dotenv()
 
@@ -19,14 +29,21 @@ repos_collection = db["repos"]
 
 # GitHub API setup
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
-HEADERS = {"Authorization": f"token {GITHUB_TOKEN}"}
 
-# Constants for GitHub rate limits and pagination
-MAX_PER_PAGE = 100
+# Constants for GitHub rate limits
 RATE_LIMIT_REPOS_PER_HOUR = 5
 API_CALLS_PER_REPO = 5  # Approx. with pagination
 PAGE_LIMIT = 1000
 
+# Cached GitHub GraphQL schema used for local query validation
+GITHUB_SCHEMA_PATH = os.getenv("GITHUB_SCHEMA_PATH", os.path.join(".cache", "github_schema.graphql"))
+
+# Shared scheduler bounding in-flight requests and pacing them against rate limits
+scheduler = GitHubScheduler()
+
+# Project URLs resolved to stable repo ids and canonical names, following renames
+registry = RepoRegistry(db["repo_registry"], scheduler, GITHUB_TOKEN, [db[name] for name in SNAPSHOT_COLLECTIONS])
+
 # Fetch project data from MongoDB
 async def fetch_projects_from_db():
     cursor = projects_collection.find({}, {"project_name": 1, "github_url": 1})
@@ -36,8 +53,8 @@ async def fetch_projects_from_db():
     return projects
 
 
-async def fetch_repo_data(repo_owner, repo_name, project_name, session):
-    query = gql("""
+# Query for one repository, parsed once and reused for every repo
+REPO_QUERY = gql("""
     query($owner: String!, $name: String!) {
       repository(owner: $owner, name: $name) {
         stargazerCount
@@ -74,99 +91,197 @@ async def fetch_repo_data(repo_owner, repo_name, project_name, session):
           }
         }
       }
+      rateLimit {
+        cost
+        remaining
+        resetAt
+      }
     }
     """)
 
-    transport = AIOHTTPTransport(url='https://api.github.com/graphql', headers={'Authorization': f'Bearer {GITHUB_TOKEN}'})
-    async with Client(transport=transport, fetch_schema_from_transport=True) as client:
-        result = await client.execute(query, variable_values={"owner": repo_owner, "name": repo_name})
-        
-        repo = result['repository']
-        
-        total_prs = repo['pullRequests']['totalCount']
-        total_issues = repo['issues']['totalCount']
-        pr_comments = repo['pullRequestsWithComments']['nodes'][0]['comments']['totalCount'] if repo['pullRequestsWithComments']['nodes'] else 0
-        issue_comments = repo['issuesWithComments']['nodes'][0]['comments']['totalCount'] if repo['issuesWithComments']['nodes'] else 0
-        
-        avg_comments_per_pr = pr_comments / total_prs if total_prs > 0 else 0
-        avg_comments_per_issue = issue_comments / total_issues if total_issues > 0 else 0
-
-        repo_data = {
-            "project_name": project_name,
-            "repo_name": f"{repo_owner}/{repo_name}",
-            "date": datetime.utcnow(),
-            "stars": repo['stargazerCount'],
-            "forks": repo['forkCount'],
-            "watchers": repo['watchers']['totalCount'],
-            "open_issues_count": repo['openIssues']['totalCount'],
-            "closed_issues_count": repo['issues']['totalCount'] - repo['openIssues']['totalCount'],
-            "open_prs_count": repo['openPullRequests']['totalCount'],
-            "closed_prs_count": repo['pullRequests']['totalCount'] - repo['openPullRequests']['totalCount'],
-            "pr_comments_count": pr_comments,
-            "issue_comments_count": issue_comments,
-            "average_comments_per_pr": avg_comments_per_pr,
-            "average_comments_per_issue": avg_comments_per_issue,
-        }
-        return repo_data
+
+# One GraphQL client for the whole run. REPO_QUERY is validated once up front against a
+# schema cached on disk when we have one (raising if GitHub's schema no longer accepts it),
+# so the client itself runs every request without local validation.
+def create_graphql_client(refresh_schema=False, url=GRAPHQL_URL, schema_path=GITHUB_SCHEMA_PATH):
+    transport = AIOHTTPTransport(url=url, headers={'Authorization': f'Bearer {GITHUB_TOKEN}'})
+    if refresh_schema:
+        return Client(transport=transport, fetch_schema_from_transport=True)
+    if os.path.exists(schema_path):
+        with open(schema_path) as schema_file:
+            Client(schema=schema_file.read()).validate(REPO_QUERY)
+    return Client(transport=transport)
+
+# Write the schema fetched by introspection so later runs can validate offline
+def save_schema(schema):
+    os.makedirs(os.path.dirname(GITHUB_SCHEMA_PATH) or ".", exist_ok=True)
+    with open(GITHUB_SCHEMA_PATH, "w") as schema_file:
+        schema_file.write(print_schema(schema))
+    print(f"Saved GitHub GraphQL schema to {GITHUB_SCHEMA_PATH}")
+
+
+async def fetch_repo_data(repo_owner, repo_name, project_name, session):
+    result = await session.execute(REPO_QUERY, variable_values={"owner": repo_owner, "name": repo_name})
+    scheduler.record_graphql_rate_limit(result.get('rateLimit'))
+    
+    repo = result['repository']
+
+    total_prs = repo['pullRequests']['totalCount']
+    total_issues = repo['issues']['totalCount']
+    pr_comments = repo['pullRequestsWithComments']['nodes'][0]['comments']['totalCount'] if repo['pullRequestsWithComments']['nodes'] else 0
+    issue_comments = repo['issuesWithComments']['nodes'][0]['comments']['totalCount'] if repo['issuesWithComments']['nodes'] else 0
+
+    avg_comments_per_pr = pr_comments / total_prs if total_prs > 0 else 0
+    avg_comments_per_issue = issue_comments / total_issues if total_issues > 0 else 0
+
+    repo_data = {
+        "project_name": project_name,
+        "repo_name": f"{repo_owner}/{repo_name}",
+        "date": datetime.datetime.utcnow(),
+        "stars": repo['stargazerCount'],
+        "forks": repo['forkCount'],
+        "watchers": repo['watchers']['totalCount'],
+        "open_issues_count": repo['openIssues']['totalCount'],
+        "closed_issues_count": repo['issues']['totalCount'] - repo['openIssues']['totalCount'],
+        "open_prs_count": repo['openPullRequests']['totalCount'],
+        "closed_prs_count": repo['pullRequests']['totalCount'] - repo['openPullRequests']['totalCount'],
+        "pr_comments_count": pr_comments,
+        "issue_comments_count": issue_comments,
+        "average_comments_per_pr": avg_comments_per_pr,
+        "average_comments_per_issue": avg_comments_per_issue,
+    }
+    return repo_data
+
+# Retry GraphQL calls that failed on rate limits or transient server errors
+def is_retryable(exc):
+    if isinstance(exc, TransportServerError):
+        return exc.code in (403, 429) or exc.code in RETRY_STATUSES
+    if isinstance(exc, TransportQueryError):
+        return any(error.get("type") == "RATE_LIMITED" for error in exc.errors or [])
+    return False
 
 # In your main function, you'll need to split the repo_name into owner and name
-async def fetch_all_repo_data():
+async def fetch_all_repo_data(refresh_schema=False):
     projects = await fetch_projects_from_db()
-    async with aiohttp.ClientSession() as session:
-        tasks = []
-        for project in projects:
-            github_url = project['github_url']
-            project_name = project['project_name']
-            repo_owner, repo_name = extract_repo_owner_and_name(github_url)
-
-            print(f"Fetching data for: {repo_owner}/{repo_name}")
-            task = asyncio.create_task(fetch_repo_data(repo_owner, repo_name, project_name, session))
-            tasks.append(task)
-        
-        repo_data_list = await asyncio.gather(*tasks)
-        for repo_data in repo_data_list:
-            if repo_data:
-                await save_to_mongo(repo_data)
-                print(f"Saved data for {repo_data['repo_name']}")
-
-def extract_repo_owner_and_name(github_url):
-    try:
-        parts = github_url.replace("https://github.com/", "").split("/")
-        return parts[0], parts[1]
-    except Exception as e:
-        print(f"Invalid GitHub URL: {github_url}")
-        return extract_repo_name(github_url), ""
-
-# Extract repo name from GitHub URL
-def extract_repo_name(github_url):
-    return github_url.replace("https://github.com/", "")
-
-# Fetch paginated data (for issues, PRs, commits)
-async def fetch_paginated_data(url, session):
-    page = 1
-    all_data = []
-    while True:
-        paginated_url = f"{url}?per_page={MAX_PER_PAGE}&page={page}"
-        async with session.get(paginated_url, headers=HEADERS) as response:
-            data = await response.json()
-            if not data or response.status != 200:
-                break
-            all_data.extend(data)
-            if len(data) < MAX_PER_PAGE:
-                break
-            page += 1
-    return all_data
-
-
-
-# Save repository data to MongoDB
-async def save_to_mongo(repo_data):
-    await repos_collection.insert_one(
-        repo_data
-    )
+    await ensure_snapshot_indexes(repos_collection, date_field="date")
+    await registry.ensure_indexes()
+    async with aiohttp.ClientSession() as http_session:
+        resolved = await registry.resolve(projects, http_session)
+    repo_ids = {repo["repo_name"]: repo["repo_id"] for repo in resolved}
 
+    graphql_client = create_graphql_client(refresh_schema)
+    async with graphql_client as session, SnapshotWriter(repos_collection, date_field="date") as writer:
+        if refresh_schema:
+            save_schema(graphql_client.schema)
+        repos = []
+        for repo in resolved:
+            repo_owner, repo_name = repo["repo_name"].split("/")
+            repos.append((repo["repo_name"], repo_owner, repo_name, repo["project_name"], session))
+
+        async def fetch(full_name, repo_owner, repo_name, project_name, session):
+            print(f"Fetching data for: {full_name}")
+            return await scheduler.run(fetch_repo_data, repo_owner, repo_name, project_name, session, retry_if=is_retryable)
+
+        await stream_snapshots(repos, with_repo_ids(fetch, repo_ids), writer)
+
+    print(f"Saved data for {writer.saved} repositories in total")
+    scheduler.report()
+
+
+# Minimal schema for the benchmark server: the fields REPO_QUERY uses, padded with filler types so
+# introspection returns a response of roughly the size of GitHub's schema
+def benchmark_schema(filler_types=300):
+    sdl = """
+    type Query { repository(owner: String!, name: String!): Repository  rateLimit: RateLimit }
+    type RateLimit { cost: Int!  remaining: Int!  resetAt: String! }
+    type Repository {
+      stargazerCount: Int!  forkCount: Int!  watchers: Count!
+      issues(states: [State!], first: Int): Connection!
+      pullRequests(states: [State!], first: Int): Connection!
+    }
+    type Count { totalCount: Int! }
+    type Connection { totalCount: Int!  nodes: [Item!]! }
+    type Item { comments: Count! }
+    enum State { OPEN CLOSED MERGED }
+    """
+    fields = " ".join(f"field{j}(first: Int, after: String): String" for j in range(12))
+    sdl += "".join(f"\n    \"\"\"Filler type {i}\"\"\"\n    type Filler{i} {{ {fields} }}" for i in range(filler_types))
+    return build_schema(sdl)
+
+
+# Per-repo latency against a local GraphQL server with a fixed per-request latency: a new client
+# with schema introspection per repo (the old code) vs one shared client, with REPO_QUERY validated once or not at all
+async def benchmark_clients(repos=20, latency=0.02):
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+
+    schema = benchmark_schema()
+    print(f"Fixture schema: {len(schema.type_map)} types")
+    connection = lambda info, **args: {"totalCount": 10, "nodes": [{"comments": {"totalCount": 3}}]}
+    root = {
+        "repository": lambda info, owner, name: {
+            "stargazerCount": 100, "forkCount": 20, "watchers": {"totalCount": 100},
+            "issues": connection, "pullRequests": connection,
+        },
+        "rateLimit": {"cost": 1, "remaining": 4999, "resetAt": "2030-01-01T00:00:00Z"},
+    }
+    # GitHub serves introspection precomputed, so the fixture answers it from a prepared body too
+    introspection = json.dumps(graphql_sync(schema, get_introspection_query()).formatted)
+    served = []
+
+    async def graphql_endpoint(request):
+        await asyncio.sleep(latency)
+        payload = await request.json()
+        served.append(payload["query"])
+        if "__schema" in payload["query"]:
+            return web.Response(text=introspection, content_type="application/json")
+        result = graphql_sync(schema, payload["query"], root_value=root, variable_values=payload.get("variables"))
+        return web.json_response(result.formatted)
+
+    app = web.Application()
+    app.router.add_post("/graphql", graphql_endpoint)
+    server = TestServer(app)
+    await server.start_server()
+    url = str(server.make_url("/graphql"))
+    names = [("owner", f"repo{i}") for i in range(repos)]
+
+    async def per_repo_client():
+        for repo_owner, repo_name in names:
+            async with Client(transport=AIOHTTPTransport(url=url), fetch_schema_from_transport=True) as session:
+                await fetch_repo_data(repo_owner, repo_name, "benchmark", session)
+
+    async def shared_client(schema_path):
+        async with create_graphql_client(url=url, schema_path=schema_path) as session:
+            for repo_owner, repo_name in names:
+                await fetch_repo_data(repo_owner, repo_name, "benchmark", session)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        schema_path = os.path.join(tmp, "schema.graphql")
+        with open(schema_path, "w") as schema_file:
+            schema_file.write(print_schema(schema))
+        runs = {
+            "client + introspection per repo": per_repo_client,
+            "shared client, validated once": lambda: shared_client(schema_path),
+            "shared client, no validation": lambda: shared_client(os.path.join(tmp, "missing.graphql")),
+        }
+        try:
+            for name, run in runs.items():
+                served.clear()
+                start = time.perf_counter()
+                await run()
+                elapsed = time.perf_counter() - start
+                print(f"{name:<32} {elapsed / repos * 1000:>7.1f} ms per repo, {len(served) / repos:.0f} requests per repo")
+        finally:
+            await server.close()
 
 
 # Main entry point
 if __name__ == "__main__":
-    asyncio.run(fetch_all_repo_data())
+    parser = argparse.ArgumentParser(description="Fetch detailed GitHub stats for all GSSoC projects")
+    parser.add_argument("--refresh-schema", action="store_true", help="Introspect the GitHub schema and cache it on disk")
+    parser.add_argument("--benchmark", action="store_true", help="Benchmark per-repo latency against a local GraphQL server and exit")
+    args = parser.parse_args()
+    if args.benchmark:
+        asyncio.run(benchmark_clients())
+        raise SystemExit
+    asyncio.run(fetch_all_repo_data(refresh_schema=args.refresh_schema))
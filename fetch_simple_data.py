@@ -1,10 +1,21 @@
 import os
+import time
+import argparse
 import aiohttp
 import asyncio
 import requests
 import motor.motor_asyncio
 from datetime import datetime
+from urllib.parse import parse_qs, urlparse
 from dotenv import load_dotenv
+from github_graphql import GRAPHQL_URL, aliased_repository_query
+from github_scheduler import GitHubScheduler
+from http_cache import HTTPCache
+from checkpoint import RunCheckpoint
+from parquet_store import export_day
+from repo_registry import SNAPSHOT_COLLECTIONS, RepoRegistry, with_repo_ids
+from adaptive_schedule import AdaptiveSchedule, print_plan
+from snapshot_store import SnapshotWriter, ensure_snapshot_indexes, stream_snapshots
 
 load_dotenv()
 
@@ -17,29 +28,61 @@ client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URI)
 db = client["gssoc"]
 projects_collection = db["projects"]
 stats_collection = db["repo_stats"]
+checkpoints_collection = db["fetch_runs"]
+
+# Shared scheduler bounding in-flight requests and pacing them against rate limits
+scheduler = GitHubScheduler(cache=HTTPCache())
+
+# Project URLs resolved to stable repo ids and canonical names, following renames
+registry = RepoRegistry(db["repo_registry"], scheduler, GITHUB_API_TOKEN, [db[name] for name in SNAPSHOT_COLLECTIONS])
+
+# Per-repo fetch intervals for --adaptive runs, driven by recent pushes and updates
+schedule = AdaptiveSchedule(db["fetch_schedule"], scheduler, GITHUB_API_TOKEN)
+
+GITHUB_API_URL = "https://api.github.com"
+
+# GraphQL limits used to size batched repository queries. GitHub rejects queries
+# touching more than 500,000 nodes and charges roughly one point per 100
+# connection requests, so we size batches to stay within a small point budget.
+GRAPHQL_MAX_NODES = 500_000
+GRAPHQL_TARGET_COST = 2
+GRAPHQL_MAX_BATCH_SIZE = 100
+
+# Fields fetched for every repository in a batched query. REST `watchers_count`
+# mirrors the stargazer count, so `stargazerCount` feeds both stars and watchers
+# to keep the stored time series continuous. `diskUsage` is the REST `size`.
+REPO_BATCH_FIELDS = """
+      stargazerCount
+      forkCount
+      diskUsage
+      issues(states: OPEN) { totalCount }
+      closedIssues: issues(states: CLOSED) { totalCount }
+      pullRequests(states: OPEN) { totalCount }
+      closedPullRequests: pullRequests(states: MERGED) { totalCount }
+"""
+REPO_BATCH_CONNECTIONS = 4
 
 # Helper to fetch repository details using REST API
 async def fetch_repo_details(repo_name, session):
-    repo_name = repo_name.removesuffix(".git") if repo_name.endswith(".git") else repo_name
     url = f"https://api.github.com/repos/{repo_name}"
     headers = {"Authorization": f"Bearer {GITHUB_API_TOKEN}"}
     
-    async with session.get(url, headers=headers) as response:
-        if response.status == 200:
-            data = await response.json()
-            return {
-                "stars": data["stargazers_count"],
-                "forks": data["forks_count"],
-                "watchers": data["watchers_count"],
-                "size": data["size"]
-            }
-        else:
-            print(f"Failed to fetch REST data for {repo_name}, status: {response.status}")
-            return None
+    response = await scheduler.request(session, "GET", url, headers=headers)
+    if response.status == 200:
+        data = response.data
+        return {
+            "stars": data["stargazers_count"],
+            "forks": data["forks_count"],
+            "watchers": data["watchers_count"],
+            "size": data["size"]
+        }
+    else:
+        print(f"Failed to fetch REST data for {repo_name}, status: {response.status}")
+        return None
 
 # Helper to fetch data using GitHub GraphQL API
 async def fetch_repo_graphql_details(repo_name, session):
-    url = "https://api.github.com/graphql"
+    url = GRAPHQL_URL
     headers = {
         "Authorization": f"Bearer {GITHUB_API_TOKEN}",
         "Content-Type": "application/json"
@@ -56,110 +99,341 @@ async def fetch_repo_graphql_details(repo_name, session):
     }
     """
 
-    repo_name = repo_name.removesuffix(".git") if repo_name.endswith(".git") else repo_name
     owner, repo = repo_name.split("/")  # owner/repo format
     variables = {
         "owner": owner,
         "repo": repo
     }
 
-    async with session.post(url, json={"query": query, "variables": variables}, headers=headers) as response:
-        if response.status == 200:
-            result = await response.json()
-            repo = result["data"]["repository"]
-            try:
-                return {
-                    "open_issues": repo["issues"]["totalCount"],
-                    "closed_issues": repo["closedIssues"]["totalCount"],
-                    "open_prs": repo["pullRequests"]["totalCount"],
-                    "closed_prs": repo["closedPullRequests"]["totalCount"]
-                }
-            except TypeError or ValueError:
-                print(f"Failed to fetch GraphQL data for {repo_name}")
-                return None
-        else:
-            print(f"Failed to fetch GraphQL data for {repo_name}, status: {response.status}")
+    response = await scheduler.request(session, "POST", url, json={"query": query, "variables": variables}, headers=headers)
+    if response.status == 200:
+        result = response.data
+        repo = result["data"]["repository"]
+        try:
+            return {
+                "open_issues": repo["issues"]["totalCount"],
+                "closed_issues": repo["closedIssues"]["totalCount"],
+                "open_prs": repo["pullRequests"]["totalCount"],
+                "closed_prs": repo["closedPullRequests"]["totalCount"]
+            }
+        except TypeError or ValueError:
+            print(f"Failed to fetch GraphQL data for {repo_name}")
             return None
+    else:
+        print(f"Failed to fetch GraphQL data for {repo_name}, status: {response.status}")
+        return None
+
 
+# Read the page number of the rel="last" link from a GitHub Link header
+def last_page_from_link(link_header):
+    for part in (link_header or "").split(","):
+        link, _, rel = part.partition(";")
+        if 'rel="last"' in rel:
+            query = parse_qs(urlparse(link.strip().strip("<>")).query)
+            return int(query["page"][0])
+    return None
 
 # Fetch number of contributors using REST API
-async def fetch_contributors_count(repo_name, session):
-    repo_name = repo_name.removesuffix(".git") if repo_name.endswith(".git") else repo_name
-    url = f"https://api.github.com/repos/{repo_name}/contributors"
+async def fetch_contributors_count(repo_name, session, anon=False, api_url=GITHUB_API_URL):
+    url = f"{api_url}/repos/{repo_name}/contributors"
     headers = {"Authorization": f"Bearer {GITHUB_API_TOKEN}"}
-    contributors_count = 0
-    page = 1
-    
-    while True:
-        paginated_url = f"{url}?page={page}&per_page=100"  # Fetch up to 100 contributors per page
-        async with session.get(paginated_url, headers=headers) as response:
-            if response.status == 200:
-                contributors = await response.json()
-                if not contributors:
-                    break
-                contributors_count += len(contributors)
-                page += 1
-            else:
-                print(f"Failed to fetch contributors for {repo_name}, status: {response.status}")
-                return None
-    
+
+    if anon:
+        return await fetch_contributors_count_paged(repo_name, url, headers, session)
+
+    # With one contributor per page, the last page number is the contributor count
+    response = await scheduler.request(session, "GET", f"{url}?per_page=1", headers=headers)
+    if response.status == 204:  # Empty repository
+        return 0
+    if response.status != 200:
+        print(f"Failed to fetch contributors for {repo_name}, status: {response.status}")
+        return None
+
+    last_page = last_page_from_link(response.headers.get("Link"))
+    return last_page if last_page is not None else len(response.data)
+
+# Count contributors including anonymous ones by fetching every page in parallel
+async def fetch_contributors_count_paged(repo_name, url, headers, session):
+    paginated_url = f"{url}?anon=1&per_page=100"  # Fetch up to 100 contributors per page
+    first_page = await scheduler.request(session, "GET", f"{paginated_url}&page=1", headers=headers)
+    if first_page.status == 204:
+        return 0
+    if first_page.status != 200:
+        print(f"Failed to fetch contributors for {repo_name}, status: {first_page.status}")
+        return None
+
+    last_page = last_page_from_link(first_page.headers.get("Link")) or 1
+    pages = await asyncio.gather(*(
+        scheduler.request(session, "GET", f"{paginated_url}&page={page}", headers=headers)
+        for page in range(2, last_page + 1)
+    ))
+
+    contributors_count = len(first_page.data)
+    for response in pages:
+        if response.status != 200:
+            print(f"Failed to fetch contributors for {repo_name}, status: {response.status}")
+            return None
+        contributors_count += len(response.data)
     return contributors_count
-# Fetch and combine repo data
-async def fetch_repo_data(repo_name, project_name, session):
-    # Fetching REST and GraphQL data
-    repo_details = await fetch_repo_details(repo_name, session)
-    repo_graphql_details = await fetch_repo_graphql_details(repo_name, session)
-    contributors_count = await fetch_contributors_count(repo_name, session)
-
-    if repo_details and repo_graphql_details and contributors_count is not None:
-        combined_data = {
-            "project_name": project_name,
-            "repo_name": repo_name,
+
+# Pick how many repositories to pack into one aliased GraphQL query
+def choose_batch_size(connections_per_repo=REPO_BATCH_CONNECTIONS):
+    # Each repository is one node plus one request per totalCount connection
+    nodes_per_repo = 1 + connections_per_repo
+    by_nodes = GRAPHQL_MAX_NODES // nodes_per_repo
+    by_cost = GRAPHQL_TARGET_COST * 100 // connections_per_repo
+    return max(1, min(by_nodes, by_cost, GRAPHQL_MAX_BATCH_SIZE))
+
+# Fetch REST and GraphQL repo details for a whole batch in a single aliased (r0, r1, ...) request
+async def fetch_repo_batch(repo_names, session):
+    headers = {
+        "Authorization": f"Bearer {GITHUB_API_TOKEN}",
+        "Content-Type": "application/json"
+    }
+    query, variables = aliased_repository_query([repo_name.split("/") for repo_name in repo_names], REPO_BATCH_FIELDS)
+
+    response = await scheduler.request(session, "POST", GRAPHQL_URL, json={"query": query, "variables": variables}, headers=headers)
+    result = response.data if response.status == 200 else None
+
+    # Node limit or timeout errors: split the batch and try the halves
+    if result is None or ("data" not in result or result["data"] is None):
+        if len(repo_names) > 1:
+            middle = len(repo_names) // 2
+            first, second = await asyncio.gather(
+                fetch_repo_batch(repo_names[:middle], session),
+                fetch_repo_batch(repo_names[middle:], session),
+            )
+            return {**first, **second}
+        reason = f"status: {response.status}" if result is None else result.get("errors")
+        print(f"Failed to fetch batched GraphQL data for {repo_names[0]}, {reason}")
+        return {}
+
+    details = {}
+    for i, repo_name in enumerate(repo_names):
+        repo = result["data"].get(f"r{i}")
+        if repo is None:
+            # Missing or renamed repositories come back as null with an error entry
+            print(f"Failed to fetch batched GraphQL data for {repo_name}")
+            continue
+        details[repo_name] = {
+            "stars": repo["stargazerCount"],
+            "forks": repo["forkCount"],
+            "watchers": repo["stargazerCount"],
+            "size": repo["diskUsage"],
+            "open_issues": repo["issues"]["totalCount"],
+            "closed_issues": repo["closedIssues"]["totalCount"],
+            "open_prs": repo["pullRequests"]["totalCount"],
+            "closed_prs": repo["closedPullRequests"]["totalCount"]
+        }
+    return details
+
+# Combine REST, GraphQL and contributor results into one snapshot document,
+# leaving out the fields of any sub-fetch that failed
+def build_combined_data(repo_name, project_name, repo_details, repo_graphql_details, contributors_count):
+    combined_data = {
+        "project_name": project_name,
+        "repo_name": repo_name,
+    }
+    if repo_details:
+        combined_data.update({
             "stars": repo_details["stars"],
             "forks": repo_details["forks"],
             "watchers": repo_details["watchers"],
-            "contributors": contributors_count,
             "size": repo_details["size"],
+        })
+    if contributors_count is not None:
+        combined_data["contributors"] = contributors_count
+    if repo_graphql_details:
+        combined_data.update({
             "open_issues": repo_graphql_details["open_issues"],
             "closed_issues": repo_graphql_details["closed_issues"],
             "open_prs": repo_graphql_details["open_prs"],
             "closed_prs": repo_graphql_details["closed_prs"],
-            "date_fetched": datetime.utcnow()  # Save the date of data fetch
-        }
-        return combined_data
-    else:
-        print(f"Failed to fetch complete data for {repo_name}")
+        })
+    combined_data["date_fetched"] = datetime.utcnow()  # Save the date of data fetch
+    return combined_data
+
+# Fetch and combine repo data
+async def fetch_repo_data(repo_name, project_name, session):
+    # Fetching REST, GraphQL and contributor data concurrently
+    results = await asyncio.gather(
+        fetch_repo_details(repo_name, session),
+        fetch_repo_graphql_details(repo_name, session),
+        fetch_contributors_count(repo_name, session),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Error while fetching data for {repo_name}: {result!r}")
+    repo_details, repo_graphql_details, contributors_count = [
+        None if isinstance(result, Exception) else result for result in results
+    ]
+
+    if not repo_details and not repo_graphql_details and contributors_count is None:
+        print(f"Failed to fetch data for {repo_name}")
         return None
+    if not repo_details or not repo_graphql_details or contributors_count is None:
+        print(f"Failed to fetch complete data for {repo_name}, keeping partial results")
+    return build_combined_data(repo_name, project_name, repo_details, repo_graphql_details, contributors_count)
 
-# Save data to MongoDB
-async def save_to_mongo(repo_data):
-    await stats_collection.insert_one(repo_data)
+# Fetch repo data for one batch of repositories with a single GraphQL query
+async def fetch_repo_data_batch(repos, session):
+    details = await fetch_repo_batch([repo_name for repo_name, _ in repos], session)
 
-# Fetch all projects and their respective repo data
-async def fetch_all_repo_data():
+    # Contributors are only exposed through REST, fetch them for the repos GraphQL found
+    fetched = [(repo_name, project_name) for repo_name, project_name in repos if repo_name in details]
+    counts = await asyncio.gather(*(fetch_contributors_count(repo_name, session) for repo_name, _ in fetched))
+
+    repo_data_list = []
+    for (repo_name, project_name), contributors_count in zip(fetched, counts):
+        if contributors_count is None:
+            print(f"Failed to fetch complete data for {repo_name}, keeping partial results")
+        repo_data_list.append(
+            build_combined_data(repo_name, project_name, details[repo_name], details[repo_name], contributors_count)
+        )
+    return repo_data_list
+
+# Mark flushed snapshots in the run checkpoint, keeping incomplete ones eligible for --resume.
+# On adaptive runs, complete snapshots also reset their repo's place in the schedule.
+def checkpoint_flush(checkpoint, adaptive=False):
+    async def record(batch):
+        complete = await checkpoint.record_flushed(batch)
+        if adaptive:
+            await schedule.record([repo_data["repo_id"] for repo_data in complete if "repo_id" in repo_data])
+    return record
+
+# Estimated GitHub API points for fetching one repo, per rate limit resource
+def fetch_cost(batched):
+    if batched:
+        # Batched GraphQL details plus the REST contributors lookup
+        return {"graphql": GRAPHQL_TARGET_COST / choose_batch_size(), "core": 1}
+    return {"graphql": 1, "core": 2}
+
+# Fetch all projects and their respective repo data, streaming results into MongoDB
+async def fetch_all_repo_data(batched=False, resume=False, export_parquet=False, adaptive=False, dry_run=False):
     projects = await projects_collection.find({}, {"project_name": 1, "github_url": 1}).to_list(None)
-    
+    if not dry_run:
+        await ensure_snapshot_indexes(stats_collection)
+        await registry.ensure_indexes()
+        await schedule.ensure_indexes()
+
     async with aiohttp.ClientSession() as session:
-        tasks = []
-        for project in projects:
-            github_url = project["github_url"]
-            project_name = project["project_name"]
-            repo_name = extract_repo_name(github_url)
-
-            print(f"Fetching data for: {repo_name}")
-            task = asyncio.create_task(fetch_repo_data(repo_name, project_name, session))
-            tasks.append(task)
-
-        repo_data_list = await asyncio.gather(*tasks)
-        for repo_data in repo_data_list:
-            if repo_data:
-                await save_to_mongo(repo_data)
-                print(f"Saved data for {repo_data['repo_name']}")
-
-# Extract repository name from GitHub URL
-def extract_repo_name(github_url):
-    return "/".join(github_url.strip("/").split("/")[-2:])
+        # A dry run only reads: no registry entries are stored and no snapshots are renamed
+        resolved = await registry.resolve(projects, session, dry_run=dry_run)
+        repo_ids = {repo["repo_name"]: repo["repo_id"] for repo in resolved}
+        if adaptive:
+            # The schedule decides what is due, so hot repos are fetched again on the same day
+            plan = await schedule.plan(resolved, session, fetch_cost(batched), dry_run=dry_run)
+            print_plan(plan, schedule.budget)
+            if dry_run:
+                return
+            resolved = [repo for _, _, repo in plan["planned"]]
+        repos = [(repo["repo_name"], repo["project_name"]) for repo in resolved]
+
+        checkpoint = RunCheckpoint(checkpoints_collection)
+        await checkpoint.ensure_indexes()
+        if resume and not adaptive:
+            done = await checkpoint.completed()
+            repos = [(repo_name, project_name) for repo_name, project_name in repos if repo_name not in done]
+            print(f"Resuming run for {checkpoint.run_date}: {len(done)} repositories already fetched, {len(repos)} left")
+            if not repos:
+                return
+        await checkpoint.start([repo_name for repo_name, _ in repos])
+
+        async with SnapshotWriter(stats_collection, on_flush=checkpoint_flush(checkpoint, adaptive)) as writer:
+            if batched:
+                batch_size = choose_batch_size()
+                batches = [(repos[i:i + batch_size], session) for i in range(0, len(repos), batch_size)]
+                print(f"Fetching data for {len(repos)} repositories in batches of {batch_size}")
+                await stream_snapshots(batches, with_repo_ids(fetch_repo_data_batch, repo_ids), writer)
+            else:
+                print(f"Fetching data for {len(repos)} repositories")
+                await stream_snapshots([(repo_name, project_name, session) for repo_name, project_name in repos], with_repo_ids(fetch_repo_data, repo_ids), writer)
+
+    print(f"Saved data for {writer.saved} repositories in total")
+    await checkpoint.finish()
+    scheduler.report()
+    if export_parquet:
+        await export_day(stats_collection, checkpoint.run_date)
+
+# Benchmark against a local fixture server shaped like GitHub's /contributors endpoint (with a
+# fixed per-request latency): Link-header counting and parallel anon pages vs the old page loop
+async def benchmark_contributors(sizes=(5, 100, 450, 2500), latency=0.02):
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+
+    served = []
+
+    async def contributors(request):
+        await asyncio.sleep(latency)
+        served.append(request.path_qs)
+        total = int(request.match_info["repo"].removeprefix("repo"))
+        per_page = int(request.query.get("per_page", 30))
+        page = int(request.query.get("page", 1))
+        first = (page - 1) * per_page
+        body = [{"login": f"user{i}", "id": i, "type": "User", "contributions": total - i} for i in range(first, min(first + per_page, total))]
+        last_page = -(-total // per_page)
+        headers = {}
+        if page < last_page:
+            headers["Link"] = f'<{request.url.update_query(page=page + 1)}>; rel="next", <{request.url.update_query(page=last_page)}>; rel="last"'
+        return web.json_response(body, headers=headers)
+
+    # The implementation this replaced: every page of 100 until an empty one
+    async def count_by_paging(repo_name, session, api_url):
+        url = f"{api_url}/repos/{repo_name}/contributors"
+        count, page = 0, 1
+        while True:
+            response = await scheduler.request(session, "GET", f"{url}?page={page}&per_page=100")
+            if response.status != 200 or not response.data:
+                return count
+            count += len(response.data)
+            page += 1
+
+    app = web.Application()
+    app.router.add_get("/repos/{owner}/{repo}/contributors", contributors)
+    server = TestServer(app)
+    await server.start_server()
+    api_url = str(server.make_url("")).rstrip("/")
+    methods = {
+        "page loop": lambda repo_name, session: count_by_paging(repo_name, session, api_url),
+        "Link header": lambda repo_name, session: fetch_contributors_count(repo_name, session, api_url=api_url),
+        "anon, parallel": lambda repo_name, session: fetch_contributors_count(repo_name, session, anon=True, api_url=api_url),
+    }
+    print(f"{'contributors':>12}  " + "  ".join(f"{name:>24}" for name in methods))
+    try:
+        async with aiohttp.ClientSession() as session:
+            for size in sizes:
+                cells = []
+                for name, count in methods.items():
+                    served.clear()
+                    start = time.perf_counter()
+                    result = await count(f"owner/repo{size}", session)
+                    elapsed = time.perf_counter() - start
+                    assert result == size, f"{name} counted {result} of {size}"
+                    cells.append(f"{len(served):>5} requests {elapsed * 1000:>7.0f} ms")
+                print(f"{size:>12}  " + "  ".join(f"{cell:>24}" for cell in cells))
+    finally:
+        await server.close()
 
 # Main execution
 if __name__ == "__main__":
-    asyncio.run(fetch_all_repo_data())
+    parser = argparse.ArgumentParser(description="Fetch GitHub stats for all GSSoC projects")
+    parser.add_argument("--batched", action="store_true", help="Fetch repo details with batched GraphQL queries")
+    parser.add_argument("--resume", action="store_true", help="Only fetch repos without a complete snapshot for today")
+    parser.add_argument("--export-parquet", action="store_true", help="Append today's snapshots to the Parquet dataset")
+    parser.add_argument("--adaptive", action="store_true", help="Only fetch repos due under the activity-based schedule, within the hourly point budget")
+    parser.add_argument("--dry-run", action="store_true", help="With --adaptive, print the planned schedule and its projected cost without fetching")
+    parser.add_argument("--benchmark-contributors", action="store_true", help="Benchmark contributor counting against a local fixture server and exit")
+    args = parser.parse_args()
+    if args.benchmark_contributors:
+        asyncio.run(benchmark_contributors())
+        raise SystemExit
+    if args.dry_run and not args.adaptive:
+        parser.error("--dry-run only plans adaptive runs, use it with --adaptive")
+    asyncio.run(fetch_all_repo_data(
+        batched=args.batched,
+        resume=args.resume,
+        export_parquet=args.export_parquet,
+        adaptive=args.adaptive,
+        dry_run=args.dry_run,
+    ))
@@ -0,0 +1,28 @@
+from datetime import datetime, timezone
+
+GRAPHQL_URL = "https://api.github.com/graphql"
+
+# Asked for in every query, so the scheduler can pace requests against the GraphQL rate limit
+RATE_LIMIT_FIELDS = "rateLimit { cost remaining resetAt }"
+
+
+# One query looking up several repositories by owner/name as aliases r0, r1, ..., each selecting
+# `fields`; returns the query and its variables. Missing repositories come back as null.
+def aliased_repository_query(owner_names, fields):
+    params = []
+    selections = []
+    variables = {}
+    for i, (owner, name) in enumerate(owner_names):
+        params.append(f"$o{i}: String!, $n{i}: String!")
+        selections.append(f"  r{i}: repository(owner: $o{i}, name: $n{i}) {{ {fields} }}")
+        variables[f"o{i}"] = owner
+        variables[f"n{i}"] = name
+    query = f"query ({', '.join(params)}) {{\n" + "\n".join(selections) + f"\n  {RATE_LIMIT_FIELDS}\n}}"
+    return query, variables
+
+
+# GitHub timestamps ("2024-10-07T12:00:00Z") as naive UTC datetimes, like the rest of our documents
+def parse_github_time(value):
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(timezone.utc).replace(tzinfo=None)
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import asyncio
+from datetime import datetime
+
+import backoff
+from multidict import CIMultiDict
+
+# Defaults for the shared GitHub request scheduler
+MAX_IN_FLIGHT = int(os.getenv("GITHUB_MAX_IN_FLIGHT", 8))
+MAX_TRIES = int(os.getenv("GITHUB_MAX_TRIES", 5))
+RATE_LIMIT_RESERVE = 50  # Points we never spend so other jobs sharing the token keep working
+PACING_THRESHOLD = 500  # Below this many remaining points, spread requests until the reset
+SECONDARY_LIMIT_WAIT = 60  # GitHub asks for at least a minute after a secondary rate limit
+RETRY_STATUSES = {502, 503, 504}
+
+
+# Response read fully inside the scheduler so the connection is released straight away
+class GitHubResponse:
+    def __init__(self, status, headers, data, from_cache=False):
+        self.status = status
+        self.headers = headers
+        self.data = data
+        self.from_cache = from_cache
+
+
+# Raised for responses worth retrying; `wait` is the delay GitHub asked for, if any
+class RetryableResponse(Exception):
+    def __init__(self, response, wait=0):
+        super().__init__(f"Retryable GitHub response, status: {response.status}")
+        self.response = response
+        self.wait = wait
+
+
+class GitHubScheduler:
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, max_tries=MAX_TRIES, reserve=RATE_LIMIT_RESERVE,
+                 pacing_threshold=PACING_THRESHOLD, cache=None):
+        self.cache = cache
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.max_tries = max_tries
+        self.reserve = reserve
+        self.pacing_threshold = pacing_threshold
+        self.budgets = {}  # resource -> (remaining, reset epoch seconds)
+        self.pause_until = 0.0
+        self.next_start = 0.0
+        self.requests_made = 0
+        self.retries = 0
+        self.points_used = {"core": 0, "graphql": 0}
+
+    # Send one HTTP request through the scheduler, retrying rate limited and server errors
+    async def request(self, session, method, url, **kwargs):
+        send = backoff.on_exception(
+            backoff.expo,
+            RetryableResponse,
+            max_tries=self.max_tries,
+            jitter=backoff.full_jitter,
+            on_backoff=self._on_backoff,
+        )(self._send)
+        try:
+            return await send(session, method, url, **kwargs)
+        except RetryableResponse as e:
+            return e.response
+
+    # Run a coroutine that does its own HTTP (e.g. a gql session) under the same limits
+    async def run(self, func, *args, resource="graphql", retry_if=lambda exc: False, **kwargs):
+        async def attempt():
+            await self._wait_for_budget(resource)
+            async with self.semaphore:
+                self.requests_made += 1
+                return await func(*args, **kwargs)
+
+        call = backoff.on_exception(
+            backoff.expo,
+            Exception,
+            max_tries=self.max_tries,
+            jitter=backoff.full_jitter,
+            giveup=lambda exc: not retry_if(exc),
+            on_backoff=self._on_backoff,
+        )(attempt)
+        return await call()
+
+    # Record the `rateLimit { cost remaining resetAt }` block of a GraphQL response
+    def record_graphql_rate_limit(self, rate_limit):
+        if not rate_limit:
+            return
+        self.points_used["graphql"] += rate_limit["cost"]
+        reset = datetime.fromisoformat(rate_limit["resetAt"].replace("Z", "+00:00")).timestamp()
+        self.budgets["graphql"] = (rate_limit["remaining"], reset)
+
+    # Print and return how many requests and points this run used
+    def report(self):
+        usage = {
+            "requests": self.requests_made,
+            "retries": self.retries,
+            "cache_hits": self.cache.hits if self.cache else 0,
+            "rest_points": self.points_used["core"],
+            "graphql_points": self.points_used["graphql"],
+            "remaining": {resource: remaining for resource, (remaining, _) in self.budgets.items()},
+        }
+        print(
+            f"GitHub API usage: {usage['requests']} requests, {usage['retries']} retries, "
+            f"{usage['cache_hits']} served from cache (304), "
+            f"{usage['rest_points']} REST points, {usage['graphql_points']} GraphQL points, "
+            f"remaining: {usage['remaining']}"
+        )
+        return usage
+
+    async def _send(self, session, method, url, **kwargs):
+        resource = "graphql" if url.endswith("/graphql") else "core"
+        use_cache = self.cache is not None and method == "GET"
+        if use_cache:
+            kwargs["headers"] = {**kwargs.get("headers", {}), **self.cache.conditional_headers(url)}
+
+        await self._wait_for_budget(resource)
+        async with self.semaphore:
+            async with session.request(method, url, **kwargs) as response:
+                body = await response.read()
+                result = GitHubResponse(response.status, response.headers, self._parse_body(body))
+        self.requests_made += 1
+
+        self._record_headers(result.headers, resource)
+        if use_cache and result.status == 304:
+            cached = self.cache.lookup(url)
+            if cached is not None:
+                # 304s do not count against the rate limit
+                cached_headers, cached_body = cached
+                headers = CIMultiDict(result.headers)
+                headers.update(cached_headers)
+                return GitHubResponse(200, headers, self._parse_body(cached_body), from_cache=True)
+        if use_cache and result.status == 200:
+            self.cache.store(url, result.headers, body)
+
+        if resource == "graphql":
+            data = result.data.get("data") if isinstance(result.data, dict) else None
+            if data and data.get("rateLimit"):
+                self.record_graphql_rate_limit(data["rateLimit"])
+            else:
+                self.points_used["graphql"] += 1
+        else:
+            self.points_used["core"] += 1
+
+        wait = self._retry_wait(result, resource)
+        if wait is not None:
+            self.pause_until = max(self.pause_until, time.time() + wait)
+            raise RetryableResponse(result, wait)
+        return result
+
+    @staticmethod
+    def _parse_body(body):
+        if not body:
+            return None
+        try:
+            return json.loads(body)
+        except ValueError:
+            return None
+
+    def _record_headers(self, headers, resource):
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is not None and reset is not None:
+            resource = headers.get("X-RateLimit-Resource", resource)
+            self.budgets[resource] = (int(remaining), float(reset))
+
+    # How long to wait before retrying this response, or None if it should not be retried
+    def _retry_wait(self, response, resource):
+        if response.status in RETRY_STATUSES:
+            return 0
+        retry_after = response.headers.get("Retry-After")
+        if response.status in (403, 429):
+            if retry_after is not None:
+                return int(retry_after)
+            if response.headers.get("X-RateLimit-Remaining") == "0":
+                return max(0, float(response.headers.get("X-RateLimit-Reset", 0)) - time.time())
+            message = (response.data or {}).get("message", "") if isinstance(response.data, dict) else ""
+            if response.status == 429 or "secondary rate limit" in message.lower():
+                return SECONDARY_LIMIT_WAIT
+            return None
+        errors = (response.data or {}).get("errors") if isinstance(response.data, dict) else None
+        if errors and any(error.get("type") == "RATE_LIMITED" for error in errors):
+            _, reset = self.budgets.get(resource, (None, 0.0))
+            return max(0, reset - time.time())
+        return None
+
+    # Hold requests back when the budget is nearly spent, pacing them until the reset
+    async def _wait_for_budget(self, resource):
+        now = time.time()
+        wait = self.pause_until - now
+        remaining, reset = self.budgets.get(resource, (None, 0.0))
+        if remaining is not None and reset > now:
+            if remaining <= self.reserve:
+                wait = max(wait, reset - now)
+            elif remaining < self.pacing_threshold:
+                spacing = (reset - now) / (remaining - self.reserve)
+                start = max(now, self.next_start)
+                self.next_start = start + spacing
+                wait = max(wait, start - now)
+            self.budgets[resource] = (remaining - 1, reset)
+        if wait > 0:
+            print(f"Waiting {wait:.1f}s for the GitHub {resource} rate limit budget")
+            await asyncio.sleep(wait)
+
+    def _on_backoff(self, details):
+        self.retries += 1
+        print(f"Retrying GitHub request (attempt {details['tries']}) after {details['wait']:.1f}s")
@@ -0,0 +1,37 @@
+import re
+
+# owner/name at the start of a GitHub URL; anything after the repo name (tree/main, issues, ...) is ignored
+GITHUB_REPO_PATTERN = re.compile(r"^(?:https?://)?(?:www\.)?github\.com/([\w.-]+)/([\w.-]+)", re.IGNORECASE)
+
+
+# (owner, name) of a GitHub repository URL, or None if it does not point at a repository
+def parse_github_url(github_url):
+    match = GITHUB_REPO_PATTERN.match(github_url.strip()) if github_url else None
+    if not match:
+        return None
+    owner, name = match.groups()
+    name = name.removesuffix(".git")
+    return (owner, name) if name else None
+
+
+# Canonical https://github.com/owner/name form: no .git suffix, trailing slash, query or sub-path
+def normalize_github_url(github_url):
+    parsed = parse_github_url(github_url)
+    return f"https://github.com/{parsed[0]}/{parsed[1]}" if parsed else None
+
+
+# Normalize every project's github_url and keep the first project per repository.
+# GitHub owner and repo names are case-insensitive, so duplicates are matched ignoring case.
+def dedupe_projects(projects):
+    seen = set()
+    unique = []
+    for project in projects:
+        github_url = normalize_github_url(project["github_url"])
+        if github_url is None:
+            print(f"Skipping {project.get('project_name')}: not a GitHub repository URL ({project['github_url']})")
+            continue
+        if github_url.lower() in seen:
+            continue
+        seen.add(github_url.lower())
+        unique.append({**project, "github_url": github_url})
+    return unique
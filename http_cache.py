@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import sqlite3
+
+# Location and size bound of the persistent HTTP cache
+CACHE_PATH = os.getenv("GITHUB_CACHE_PATH", os.path.join(".cache", "github_http.sqlite"))
+CACHE_MAX_BYTES = int(os.getenv("GITHUB_CACHE_MAX_MB", 64)) * 1024 * 1024
+
+# Response headers replayed alongside a cached body (pagination lives in Link)
+CACHED_HEADERS = ("ETag", "Last-Modified", "Link")
+
+
+# Persistent ETag / Last-Modified cache for GitHub GET requests, evicted least recently used first
+class HTTPCache:
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self.conn.commit()
+
+    # Validators to send with a request for this URL
+    def conditional_headers(self, url):
+        row = self.conn.execute("SELECT headers FROM responses WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return {}
+        headers = json.loads(row[0])
+        conditional = {}
+        if headers.get("ETag"):
+            conditional["If-None-Match"] = headers["ETag"]
+        if headers.get("Last-Modified"):
+            conditional["If-Modified-Since"] = headers["Last-Modified"]
+        return conditional
+
+    # Cached (headers, body) for a URL after a 304, or None
+    def lookup(self, url):
+        row = self.conn.execute("SELECT headers, body FROM responses WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        self.conn.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), url))
+        self.conn.commit()
+        self.hits += 1
+        return json.loads(row[0]), bytes(row[1])
+
+    # Store a 200 response if GitHub gave us something to revalidate it with
+    def store(self, url, headers, body):
+        kept = {name: headers[name] for name in CACHED_HEADERS if headers.get(name)}
+        if "ETag" not in kept and "Last-Modified" not in kept:
+            return
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses (url, headers, body, size, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (url, json.dumps(kept), body, len(body), now, now),
+        )
+        self.evict()
+        self.conn.commit()
+
+    # Body stored under `key` within the last `max_age` seconds, for results cached by age
+    # (e.g. GraphQL answers, which have no validators) rather than revalidated with GitHub
+    def fresh(self, key, max_age):
+        row = self.conn.execute("SELECT body, stored_at FROM responses WHERE url = ?", (key,)).fetchone()
+        if row is None or time.time() - row[1] > max_age:
+            return None
+        self.conn.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), key))
+        self.conn.commit()
+        self.hits += 1
+        return bytes(row[0])
+
+    # Store a body to be read back with fresh()
+    def put(self, key, body):
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses (url, headers, body, size, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, "{}", body, len(body), now, now),
+        )
+        self.evict()
+        self.conn.commit()
+
+    # Drop least recently used entries until the cache fits in max_bytes
+    def evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.conn.execute("SELECT url, size FROM responses ORDER BY accessed_at").fetchall()
+        stale = []
+        for url, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append((url,))
+            total -= size
+        self.conn.executemany("DELETE FROM responses WHERE url = ?", stale)
+
+    def close(self):
+        self.conn.close()
+
+
+# Conditional GET for the synchronous `requests` path; a 304 is served as a 200 from the cache
+def cached_get(session, url, cache, headers=None, **kwargs):
+    headers = {**(headers or {}), **cache.conditional_headers(url)}
+    response = session.get(url, headers=headers, **kwargs)
+    if response.status_code == 304:
+        cached = cache.lookup(url)
+        if cached is not None:
+            cached_headers, body = cached
+            response.status_code = 200
+            response.headers.update(cached_headers)
+            response._content = body
+    elif response.status_code == 200:
+        cache.store(url, response.headers, response.content)
+    return response
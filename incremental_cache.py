@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import threading
+import pandas as pd
+
+from parquet_store import dataset_exists, load_snapshots, read_version
+from snapshot_queries import compact_snapshots, find_snapshots, snapshots_version
+from snapshot_store import FLUSH_INTERVAL
+
+# How often a dashboard checks for new snapshots, and where the loaded frame is kept between restarts
+CACHE_TTL_SECONDS = int(os.getenv("SNAPSHOT_CACHE_TTL", 300))
+CACHE_PATH = os.getenv("SNAPSHOT_CACHE_PATH", os.path.join(".cache", "repo_stats_snapshots.parquet"))
+
+# date_fetched is stamped when a repo is fetched but the snapshot is written up to a few
+# flushes later, so polling re-reads this far behind the high-water mark to catch late writes
+REFRESH_OVERLAP = pd.Timedelta(seconds=FLUSH_INTERVAL * 24)
+
+
+# Snapshot frame that grows incrementally. `fetch_since(mark)` returns the snapshots fetched
+# after a time (all of them when mark is None); refreshes ask for those after the high-water
+# mark less REFRESH_OVERLAP and only load the rows not already held.
+# `version()`, when given, changes whenever already loaded snapshots are rewritten in place
+# (e.g. moved to a renamed repo's new name); the frame is then reloaded from scratch.
+class IncrementalSnapshotCache:
+    def __init__(self, fetch_since, path=CACHE_PATH, ttl=CACHE_TTL_SECONDS, version=None):
+        self.fetch_since = fetch_since
+        self.version = version
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.checked_at = 0.0
+        self.frame, self.data_version = self._read_disk()
+        self.high_water_mark = self.frame["date_fetched"].max() if not self.frame.empty else None
+
+    # Current frame, its high-water mark and data version, polling for newer snapshots once the
+    # TTL has passed. Together the mark and version identify the frame's contents.
+    def get(self):
+        with self.lock:
+            if time.time() - self.checked_at >= self.ttl:
+                self._refresh()
+            return self.frame, self.high_water_mark, self.data_version
+
+    def _refresh(self):
+        if self.version is not None:
+            current = self.version()
+            if current != self.data_version:
+                if not self.frame.empty:
+                    print(f"Stored snapshots were rewritten (version {current}), reloading all of them")
+                self.frame, self.high_water_mark, self.data_version = pd.DataFrame(), None, current
+        mark = self.high_water_mark
+        new = self.fetch_since(None if mark is None else mark - REFRESH_OVERLAP)
+        self.checked_at = time.time()
+
+        # Rows re-read from the overlap that we already hold are not new
+        frame = self.frame
+        if not frame.empty and not new.empty:
+            new_rows = pd.MultiIndex.from_arrays([new["repo_name"], new["date_fetched"]])
+            held_rows = pd.MultiIndex.from_arrays([frame["repo_name"], frame["date_fetched"]])
+            new = new[~new_rows.isin(held_rows)]
+        if new.empty:
+            return
+
+        # A same-day re-fetch updates that day's snapshot, so drop the version we already hold
+        if not frame.empty:
+            new_keys = pd.MultiIndex.from_arrays([new["repo_name"], new["date_fetched"].dt.floor("D")])
+            old_keys = pd.MultiIndex.from_arrays([frame["repo_name"], frame["date_fetched"].dt.floor("D")])
+            frame = frame[~old_keys.isin(new_keys)]
+
+        # Concatenating mixes categories and integer widths, so the merged frame is compacted again
+        merged = pd.concat([frame, new], ignore_index=True) if not frame.empty else new.reset_index(drop=True)
+        self.frame = compact_snapshots(merged)
+        self.high_water_mark = self.frame["date_fetched"].max()
+        self._write_disk()
+        print(f"Loaded {len(new)} new snapshots, up to {self.high_water_mark}")
+
+    # The frame and the version it was loaded at, kept in a small JSON file next to it
+    def _read_disk(self):
+        if self.path and os.path.exists(self.path):
+            data_version = None
+            if os.path.exists(f"{self.path}.json"):
+                with open(f"{self.path}.json") as version_file:
+                    data_version = json.load(version_file).get("version")
+            return pd.read_parquet(self.path), data_version
+        return pd.DataFrame(), None
+
+    def _write_disk(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        self.frame.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, self.path)
+        # Written after the frame, so a crash in between only costs one extra reload
+        with open(f"{self.path}.json", "w") as version_file:
+            json.dump({"version": self.data_version}, version_file)
+
+
+# fetch_since for the dashboards: the Parquet dataset when configured and exported, MongoDB otherwise
+def snapshot_source(collection, parquet_path=None):
+    def fetch_since(mark):
+        if parquet_path and not dataset_exists(parquet_path):
+            print(f"No Parquet dataset at {parquet_path} yet, reading snapshots from MongoDB")
+        elif parquet_path:
+            df = load_snapshots(parquet_path, start=mark)
+            return df if mark is None else df[df["date_fetched"] > mark].reset_index(drop=True)
+        return find_snapshots(collection, after=None if mark is None else pd.Timestamp(mark).to_pydatetime())
+    return fetch_since
+
+
+# version for the dashboards, read from the same source as snapshot_source: the version the
+# Parquet dataset was exported at, or the one of the Mongo snapshots themselves
+def snapshot_version(collection, parquet_path=None):
+    def version():
+        if parquet_path and dataset_exists(parquet_path):
+            return read_version(parquet_path)
+        return snapshots_version(collection)
+    return version
@@ -0,0 +1,153 @@
+import os
+import pymongo
+import pandas as pd
+from bson import ObjectId
+from datetime import datetime
+from dotenv import load_dotenv
+
+from snapshot_queries import latest_fetch_date, load_gain_frames
+from snapshot_store import METRICS, snapshot_day
+from scoring import composite_score, tiered_weights
+
+load_dotenv()
+
+# Set reference date to October 7th of the current year
+REFERENCE_DATE = datetime(datetime.now().year, 10, 7)
+
+GAIN_METRICS = ["stars", "forks", "watchers", "contributors", "closed_prs"]
+
+# Gain column suffix per leaderboard period, and the column each period is ranked by
+GAIN_SUFFIXES = {"overall": "_gain", "daily": "_daily_gain", "weekly": "_weekly_gain"}
+RANK_COLUMNS = {"overall": "composite_score", "daily": "stars_daily_gain", "weekly": "stars_weekly_gain"}
+
+# Composite score weights over the gain percentiles: forks, contributors and closed PRs carry 70%
+COMPOSITE_WEIGHTS = tiered_weights(low=["stars", "watchers"])
+
+
+def calculate_gains(frames, period='overall'):
+    latest_df = frames['latest'].copy()
+    base = {'overall': frames['earliest'], 'daily': frames['day_ago'], 'weekly': frames['week_ago']}[period]
+    for metric in GAIN_METRICS:
+        latest_df[f"{metric}{GAIN_SUFFIXES[period]}"] = latest_df[metric] - base[metric]
+    return latest_df.reset_index()
+
+
+# Gains, composite score and rank for one period, best first
+def build_leaderboard(frames, period):
+    df = calculate_gains(frames, period)
+    df["composite_score"] = composite_score(df, COMPOSITE_WEIGHTS, suffix=GAIN_SUFFIXES[period])
+    df = df.sort_values(RANK_COLUMNS[period], ascending=False, na_position="last").reset_index(drop=True)
+    df["rank"] = df.index + 1
+    return df
+
+
+# Compute every period's leaderboard once and store it as a new run. Readers follow the
+# period's entry in leaderboard_runs, which is switched to the new run only once all of its
+# rows are in; the replaced runs for the same date are deleted afterwards.
+def materialize_leaderboards(db, reference_date=REFERENCE_DATE):
+    stats_collection = db["repo_stats"]
+    leaderboards_collection = db["leaderboards"]
+    runs_collection = db["leaderboard_runs"]
+    # Two runs of the same date and period exist side by side until the old one is deleted
+    if "period_date_rank" in leaderboards_collection.index_information():
+        leaderboards_collection.drop_index("period_date_rank")
+    leaderboards_collection.create_index([("run_id", pymongo.ASCENDING), ("rank", pymongo.ASCENDING)], name="run_id_rank", unique=True)
+    leaderboards_collection.create_index([("period", pymongo.ASCENDING), ("date", pymongo.DESCENDING)], name="period_date")
+    runs_collection.create_index("period", name="period", unique=True)
+
+    latest_date = latest_fetch_date(stats_collection)
+    if latest_date is None:
+        print("No snapshots to build leaderboards from")
+        return
+    date = snapshot_day(latest_date)
+    frames = load_gain_frames(stats_collection, reference_date)
+
+    for period in GAIN_SUFFIXES:
+        df = build_leaderboard(frames, period)
+        columns = ["repo_name", "rank", "composite_score"] + [f"{metric}{GAIN_SUFFIXES[period]}" for metric in GAIN_METRICS]
+        rows = df[columns].astype(object).where(df[columns].notna(), None).to_dict("records")
+        run_id = ObjectId()
+        for row in rows:
+            row.update({"date": date, "period": period, "run_id": run_id})
+        if rows:
+            leaderboards_collection.insert_many(rows, ordered=False)
+        runs_collection.update_one(
+            {"period": period},
+            {"$set": {"run_id": run_id, "date": date, "updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+        leaderboards_collection.delete_many({"date": date, "period": period, "run_id": {"$ne": run_id}})
+        print(f"Saved {period} leaderboard for {date} ({len(rows)} repositories)")
+
+
+# Top rows of the current run of a period's leaderboard, served by the run_id_rank index
+def load_leaderboard(db, period, top_n=10):
+    run = db["leaderboard_runs"].find_one({"period": period})
+    if run is None:
+        return pd.DataFrame()
+    rows = db["leaderboards"].find({"run_id": run["run_id"]}, {"_id": 0, "run_id": 0}).sort("rank", pymongo.ASCENDING).limit(top_n)
+    return pd.DataFrame(list(rows))
+
+
+# Check: the Mongo-side gain frames and leaderboards match the pandas calculate_gains the
+# dashboard used before, for every period. Needs mongomock; run with `python leaderboard.py --check`.
+def check_against_pandas(repos=30, days=20, reference_date=REFERENCE_DATE):
+    import mongomock
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    collection = mongomock.MongoClient()["gssoc"]["repo_stats"]
+    collection.insert_many([
+        {
+            "project_name": f"Project {repo}",
+            "repo_name": f"owner{repo}/repo{repo}",
+            "date_fetched": reference_date + pd.Timedelta(days=day, minutes=int(rng.integers(0, 600))),
+            **{metric: int(rng.integers(0, 100)) + 10 * day for metric in METRICS},
+        }
+        for repo in range(repos) for day in range(days)
+        if rng.random() > 0.1  # some repos miss some days
+    ])
+
+    # The dashboard's previous pandas implementation, run over the full collection
+    def pandas_gains(df, period):
+        df = df.copy()
+        df['days_since_reference'] = (df['date_fetched'] - reference_date).dt.days
+        latest_df = df.sort_values('days_since_reference').groupby('repo_name').last()
+        if period == 'overall':
+            base = df.sort_values('days_since_reference').groupby('repo_name').first()
+        elif period == 'daily':
+            base = df[df['days_since_reference'] == latest_df['days_since_reference'].max() - 1].groupby('repo_name').last()
+        else:
+            base = df[df['days_since_reference'] >= latest_df['days_since_reference'].max() - 7].groupby('repo_name').first()
+        for metric in GAIN_METRICS:
+            latest_df[f"{metric}{GAIN_SUFFIXES[period]}"] = latest_df[metric] - base[metric]
+        return latest_df.reset_index()
+
+    df = pd.DataFrame(list(collection.find({}, {"_id": 0})))
+    frames = load_gain_frames(collection, reference_date)
+    for period in GAIN_SUFFIXES:
+        columns = ["repo_name"] + [f"{metric}{GAIN_SUFFIXES[period]}" for metric in GAIN_METRICS]
+        if period == "overall":
+            columns.append("composite_score")
+        expected = pandas_gains(df, period)
+        if period == "overall":
+            # The dashboard's previous composite score: 70% forks/contributors/closed PRs, 30% stars/watchers
+            ranks = {metric: expected[f"{metric}_gain"].rank(pct=True) for metric in GAIN_METRICS}
+            expected["composite_score"] = (0.7 * (ranks["forks"] + ranks["contributors"] + ranks["closed_prs"]) / 3
+                                           + 0.3 * (ranks["stars"] + ranks["watchers"]) / 2)
+        expected = expected[columns].sort_values("repo_name").reset_index(drop=True)
+        actual = build_leaderboard(frames, period)[columns].sort_values("repo_name").reset_index(drop=True)
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+        print(f"{period}: gains of {len(actual)} repositories match the pandas implementation")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Materialize the daily leaderboards from repo_stats")
+    parser.add_argument("--check", action="store_true", help="Compare the Mongo aggregation with the old pandas gains on mongomock data and exit")
+    args = parser.parse_args()
+    if args.check:
+        check_against_pandas()
+    else:
+        materialize_leaderboards(pymongo.MongoClient(os.getenv("MONGO_URI"))["gssoc"])
@@ -0,0 +1,101 @@
+import threading
+import pymongo
+import streamlit as st
+from pymongo import monitoring
+
+# Pool and timeout settings for dashboard connections; override any of them under
+# [mongo_client] in the Streamlit secrets. Dashboards only read, so secondaries are fine.
+DEFAULT_CLIENT_OPTIONS = {
+    "maxPoolSize": 20,
+    "minPoolSize": 0,
+    "maxIdleTimeMS": 60_000,
+    "waitQueueTimeoutMS": 10_000,
+    "connectTimeoutMS": 5_000,
+    "serverSelectionTimeoutMS": 5_000,
+    "socketTimeoutMS": 30_000,
+    "readPreference": "secondaryPreferred",
+    "appname": "gssoc-dashboard",
+}
+
+
+# Connection pool counters gathered from pymongo's pool events
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.open = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "open": self.open,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+            }
+
+    def connection_created(self, event):
+        with self.lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self.lock:
+            self.open -= 1
+
+    def connection_checked_out(self, event):
+        with self.lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def connection_checked_in(self, event):
+        with self.lock:
+            self.in_use -= 1
+
+    def connection_check_out_failed(self, event):
+        with self.lock:
+            self.checkout_failures += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+
+# Shared by every session of this Streamlit process, since imported modules are not re-run
+pool_metrics = PoolMetrics()
+
+
+# One MongoClient (and so one connection pool) per Streamlit process, however many sessions rerun the script
+@st.cache_resource
+def get_mongo_client():
+    options = {**DEFAULT_CLIENT_OPTIONS, **dict(st.secrets.get("mongo_client", {}))}
+    return pymongo.MongoClient(st.secrets["MONGO_URI"], event_listeners=[pool_metrics], **options)
+
+
+def get_database(name="gssoc"):
+    return get_mongo_client()[name]
+
+
+# Pool utilization for this process: open and checked-out connections, peak use and failed checkouts
+def pool_stats():
+    stats = pool_metrics.snapshot()
+    stats["max_pool_size"] = get_mongo_client().options.pool_options.max_pool_size
+    return stats
@@ -0,0 +1,50 @@
+import mongomock
+
+
+# Motor-style awaitable wrapper around an in-memory mongomock collection, so the
+# `python module.py` checks can run the async fetch code without a MongoDB server
+class AsyncCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.items = None
+
+    def sort(self, *args, **kwargs):
+        self.cursor = self.cursor.sort(*args, **kwargs)
+        return self
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.items is None:
+            self.items = iter(self.cursor)
+        try:
+            return next(self.items)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length=None):
+        return list(self.cursor)[:length]
+
+
+class AsyncCollection:
+    def __init__(self, collection=None):
+        self.collection = collection if collection is not None else mongomock.MongoClient()["gssoc"]["check"]
+
+    def with_options(self, **kwargs):
+        return self
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self.collection.find(*args, **kwargs))
+
+    def aggregate(self, *args, **kwargs):
+        return AsyncCursor(self.collection.aggregate(*args, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+        if not callable(method):
+            return method
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
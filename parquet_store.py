@@ -0,0 +1,157 @@
+import os
+import json
+import timeit
+import argparse
+import tempfile
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+from dotenv import load_dotenv
+
+from snapshot_queries import snapshots_version
+from snapshot_store import METRICS, snapshot_day
+
+load_dotenv()
+
+# Root of the date-partitioned snapshot dataset (a local path or a pyarrow filesystem URI)
+PARQUET_DATASET_PATH = os.getenv("PARQUET_DATASET_PATH", os.path.join("data", "repo_stats"))
+
+SNAPSHOT_SCHEMA = pa.schema(
+    [("project_name", pa.string()), ("repo_name", pa.string())]
+    + [(metric, pa.int64()) for metric in METRICS]
+    + [("date_fetched", pa.timestamp("us")), ("snapshot_date", pa.string())]
+)
+
+# Columns the dashboards read; project_name stays on disk but is never loaded
+SNAPSHOT_COLUMNS = ["repo_name", "date_fetched"] + METRICS
+
+# One hive-style directory per day: snapshot_date=YYYY-MM-DD/
+PARTITIONING = ds.partitioning(pa.schema([("snapshot_date", pa.string())]), flavor="hive")
+
+# Snapshots version (see snapshot_queries.snapshots_version) the dataset was last exported at,
+# kept in the dataset root; the leading underscore keeps it out of dataset discovery
+VERSION_FILE = "_snapshots_version.json"
+
+
+# Replace one day's partition with the given snapshot documents
+def write_day(repo_data_list, day, root=PARQUET_DATASET_PATH):
+    rows = [{**{name: repo_data.get(name) for name in SNAPSHOT_SCHEMA.names}, "snapshot_date": day} for repo_data in repo_data_list]
+    table = pa.Table.from_pylist(rows, schema=SNAPSHOT_SCHEMA)
+    ds.write_dataset(
+        table,
+        root,
+        format="parquet",
+        partitioning=PARTITIONING,
+        basename_template="part-{i}.parquet",
+        existing_data_behavior="delete_matching",
+    )
+    print(f"Exported {table.num_rows} snapshots for {day} to {root}")
+
+
+# Filesystem and path for a dataset root given as a local path or a filesystem URI
+def dataset_filesystem(root):
+    if "://" not in root:
+        return pafs.LocalFileSystem(), os.path.abspath(root)
+    return pafs.FileSystem.from_uri(root)
+
+
+# Whether a dataset has been exported at `root` yet
+def dataset_exists(root=PARQUET_DATASET_PATH):
+    filesystem, path = dataset_filesystem(root)
+    return filesystem.get_file_info(path).type == pafs.FileType.Directory
+
+
+def read_version(root=PARQUET_DATASET_PATH):
+    filesystem, path = dataset_filesystem(root)
+    version_path = f"{path}/{VERSION_FILE}"
+    if filesystem.get_file_info(version_path).type != pafs.FileType.File:
+        return None
+    with filesystem.open_input_stream(version_path) as version_file:
+        return json.loads(version_file.read()).get("version")
+
+
+def write_version(version, root=PARQUET_DATASET_PATH):
+    filesystem, path = dataset_filesystem(root)
+    filesystem.create_dir(path, recursive=True)
+    with filesystem.open_output_stream(f"{path}/{VERSION_FILE}") as version_file:
+        version_file.write(json.dumps({"version": version}).encode())
+
+
+# Load snapshots as a DataFrame, reading only the requested columns and day partitions
+def load_snapshots(root=PARQUET_DATASET_PATH, columns=SNAPSHOT_COLUMNS, start=None, end=None):
+    dataset = ds.dataset(root, format="parquet", partitioning=PARTITIONING)
+    day_filter = None
+    if start is not None:
+        day_filter = ds.field("snapshot_date") >= snapshot_day(start)
+    if end is not None:
+        end_filter = ds.field("snapshot_date") <= snapshot_day(end)
+        day_filter = end_filter if day_filter is None else day_filter & end_filter
+    table = dataset.to_table(columns=columns, filter=day_filter)
+    # split_blocks/self_destruct let pandas take over the Arrow buffers without a consolidating copy
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+# Export one day of snapshots from the fetcher's Mongo collection (Motor)
+async def export_day(collection, day, root=PARQUET_DATASET_PATH):
+    repo_data_list = await collection.find({"snapshot_date": day}, {"_id": 0}).to_list(None)
+    write_day(repo_data_list, day, root)
+
+
+# Rebuild the dataset from MongoDB, e.g. when first enabling the export. `since` limits it to the
+# day partitions from that snapshot_date on, plus older days whose snapshots were renamed since then.
+# The version is read before the snapshots and written after them, so a rename landing
+# in between only makes the dashboards reload once more.
+def backfill(collection, root=PARQUET_DATASET_PATH, since=None):
+    version = snapshots_version(collection)
+    days = {}
+    query = {}
+    if since is not None:
+        renamed_days = collection.distinct("snapshot_date", {"renamed_at": {"$gte": datetime.fromisoformat(since)}})
+        query = {"$or": [{"snapshot_date": {"$gte": since}}, {"snapshot_date": {"$in": renamed_days}}]}
+    for repo_data in collection.find(query, {"_id": 0}):
+        day = repo_data.get("snapshot_date") or snapshot_day(repo_data["date_fetched"])
+        days.setdefault(day, []).append(repo_data)
+    for day, repo_data_list in sorted(days.items()):
+        write_day(repo_data_list, day, root)
+    write_version(version, root)
+
+
+# Load times for synthetic datasets of 1,000 repos: the whole dataset, the last week only, and
+# building the same frame from a list of snapshot dicts the way the Mongo path does
+def benchmark(sizes=(10_000, 100_000, 1_000_000), repos=1000):
+    rng = np.random.default_rng(0)
+    for rows in sizes:
+        days = rows // repos
+        dates = pd.date_range("2024-10-07", periods=days, freq="D")
+        table = pa.table({
+            "project_name": np.tile([f"Project {i}" for i in range(repos)], days),
+            "repo_name": np.tile([f"owner{i}/repo{i}" for i in range(repos)], days),
+            **{metric: rng.integers(0, 10_000, rows) for metric in METRICS},
+            "date_fetched": np.repeat(dates.to_numpy(dtype="datetime64[us]"), repos),
+            "snapshot_date": np.repeat(dates.strftime("%Y-%m-%d"), repos),
+        }, schema=SNAPSHOT_SCHEMA)
+        documents = table.to_pylist()
+        with tempfile.TemporaryDirectory() as root:
+            ds.write_dataset(table, root, format="parquet", partitioning=PARTITIONING, max_partitions=days)
+            full = timeit.timeit(lambda: load_snapshots(root), number=3) / 3
+            week = timeit.timeit(lambda: load_snapshots(root, start=dates[-7]), number=3) / 3
+        from_dicts = timeit.timeit(lambda: pd.DataFrame(documents, columns=SNAPSHOT_COLUMNS), number=1)
+        print(f"{rows:>9} rows ({days} days): Parquet {full * 1000:>7.0f} ms, last week {week * 1000:>5.0f} ms, "
+              f"DataFrame from dicts {from_dicts * 1000:>7.0f} ms")
+
+
+if __name__ == "__main__":
+    import pymongo
+
+    parser = argparse.ArgumentParser(description="Export repo_stats snapshots to a date-partitioned Parquet dataset")
+    parser.add_argument("--root", default=PARQUET_DATASET_PATH, help="Dataset root path or URI")
+    parser.add_argument("--since", help="Only re-export day partitions from this snapshot_date (YYYY-MM-DD) on")
+    parser.add_argument("--benchmark", action="store_true", help="Time dataset loads at 10k, 100k and 1M rows and exit")
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark()
+        raise SystemExit
+    backfill(pymongo.MongoClient(os.getenv("MONGO_URI"))["gssoc"]["repo_stats"], args.root, args.since)
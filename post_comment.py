@@ -1,71 +1,89 @@
 import os
 import sys
+import json
 import requests
+from http_cache import HTTPCache, cached_get
 
+# How long a contributor's stats are reused for further PR events in the same repo
+CONTRIBUTOR_STATS_TTL = int(os.getenv("CONTRIBUTOR_STATS_TTL", 15 * 60))
 
-def post_comment(repo_owner, repo_name, pr_number, github_token):
-    # Get PR author
-    pr_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/pulls/{pr_number}"
-    headers = {
-        "Authorization": f"token {github_token}",
-        "Accept": "application/vnd.github.v3+json"
+# Merged PRs by one author in one repo, counted by GitHub's search rather than filtered client-side
+CONTRIBUTOR_STATS_QUERY = """
+query($search: String!) {
+    search(query: $search, type: ISSUE, first: 10) {
+        issueCount
+        nodes {
+            ... on PullRequest {
+                additions
+                deletions
+            }
+        }
+    }
+    rateLimit {
+        cost
+        remaining
+        resetAt
     }
-    pr_response = requests.get(pr_url, headers=headers)
-    pr_author = pr_response.json()["user"]["login"]
-
-
-    # Get PR stats
-    query = f"""
-    query($owner:String!, $repo:String!) {{
-            repository(owner:$owner, name:$repo) {{
-                pullRequests(first:100, orderBy:{{field:CREATED_AT, direction:DESC}}) {{
-                    totalCount
-                    nodes {{
-                        author {{
-                            login
-                        }}
-                        additions
-                        deletions
-                    }}
-                }}
-            }}
-        }}
-    """
-    variables = {
-        "owner": repo_owner,
-        "repo": repo_name,
-        "author": pr_author
+}
+"""
+
+
+# Merged PR count and the line changes of the author's 10 most recent merged PRs, cached per (repo, author)
+def fetch_contributor_stats(session, repo_owner, repo_name, author, cache, ttl=CONTRIBUTOR_STATS_TTL):
+    key = f"contributor-stats:{repo_owner}/{repo_name}:{author}"
+    cached = cache.fresh(key, ttl)
+    if cached is not None:
+        return json.loads(cached)
+
+    search = f"repo:{repo_owner}/{repo_name} is:pr is:merged author:{author} sort:created-desc"
+    response = session.post("https://api.github.com/graphql", json={"query": CONTRIBUTOR_STATS_QUERY, "variables": {"search": search}})
+    response.raise_for_status()
+    data = response.json()["data"]["search"]
+
+    recent_prs = [pr for pr in data["nodes"] if pr]
+    stats = {
+        "total_prs": data["issueCount"],
+        "total_additions": sum(pr["additions"] for pr in recent_prs),
+        "total_deletions": sum(pr["deletions"] for pr in recent_prs),
     }
-    graphql_url = "https://api.github.com/graphql"
-    response = requests.post(graphql_url, json={"query": query, "variables": variables}, headers=headers)
-    # print(response.json())
-    data = response.json()["data"]["repository"]["pullRequests"]
+    cache.put(key, json.dumps(stats).encode())
+    return stats
 
 
-    total_prs = data["totalCount"]
-    recent_prs = data["nodes"][:10]
-    total_additions = sum(pr["additions"] for pr in recent_prs)
-    total_deletions = sum(pr["deletions"] for pr in recent_prs)
+def post_comment(repo_owner, repo_name, pr_number, github_token):
+    cache = HTTPCache()
+    # One pooled session for the PR lookup, the stats query and the comment
+    with requests.Session() as session:
+        session.headers.update({
+            "Authorization": f"token {github_token}",
+            "Accept": "application/vnd.github.v3+json"
+        })
+
+        # Get PR author
+        pr_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/pulls/{pr_number}"
+        pr_response = cached_get(session, pr_url, cache)
+        pr_author = pr_response.json()["user"]["login"]
 
-    comment1 = f"![Author's GitHub stats](https://github-readme-stats.vercel.app/api?username={pr_author}&show_icons=true&theme=radical)"
-    # Prepare comment
-    # comment = f"""
-    # 📊 **Contributor Stats for @{pr_author}:**
+        # Get PR stats
+        stats = fetch_contributor_stats(session, repo_owner, repo_name, pr_author, cache)
 
-    # - **Total PRs Merged:** {total_prs}
-    # - **Recent Contributions (last 10 PRs):**
-    # - Lines Added: {total_additions}
-    # - Lines Deleted: {total_deletions}
+        # Prepare comment
+        comment = f"""📊 **Contributor Stats for @{pr_author}:**
 
-    # Keep up the great work! 🚀
+- **Total PRs Merged:** {stats["total_prs"]}
+- **Recent Contributions (last 10 merged PRs):**
+  - Lines Added: {stats["total_additions"]}
+  - Lines Deleted: {stats["total_deletions"]}
 
-    # ![Author's GitHub stats](https://github-readme-stats.vercel.app/api?username={pr_author}&show_icons=true&theme=radical)
-    # """
+Keep up the great work! 🚀
 
+![Author's GitHub stats](https://github-readme-stats.vercel.app/api?username={pr_author}&show_icons=true&theme=radical)
+"""
 
-    # Post comment
-    comment_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/issues/{pr_number}/comments"
-    requests.post(comment_url, json={"body": comment1}, headers=headers)
+        # Post comment
+        comment_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/issues/{pr_number}/comments"
+        session.post(comment_url, json={"body": comment})
+    cache.close()
 
 
 if __name__ == "__main__":
@@ -73,4 +91,4 @@ if __name__ == "__main__":
     repo_name = sys.argv[2]
     pr_number = sys.argv[3]
     github_token = sys.argv[4]
-    post_comment(repo_owner, repo_name, pr_number, github_token)
\ No newline at end of file
+    post_comment(repo_owner, repo_name, pr_number, github_token)
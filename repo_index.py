@@ -0,0 +1,47 @@
+import timeit
+import numpy as np
+import pandas as pd
+
+
+# Row positions of every repo's snapshots, grouped by repo and sorted by date, built once per data load.
+# Looking up a repo then costs O(its own rows) instead of a boolean scan and sort of the whole frame.
+class RepoIndex:
+    def __init__(self, df):
+        self.frame = df
+        repos = pd.Categorical(df["repo_name"])
+        dates = df["date_fetched"].to_numpy()
+        # Positions sorted by repo code, then date; rows without a repo_name (code -1) sort first and are skipped
+        self.order = np.lexsort((dates, repos.codes))
+        bounds = np.searchsorted(repos.codes[self.order], np.arange(len(repos.categories) + 1))
+        self.repos = list(repos.categories)
+        self.slices = {repo: (bounds[i], bounds[i + 1]) for i, repo in enumerate(self.repos)}
+
+    # All snapshots of one repo, oldest first; empty when the repo is unknown
+    def history(self, repo_name):
+        start, end = self.slices.get(repo_name, (0, 0))
+        return self.frame.iloc[self.order[start:end]]
+
+# Micro-benchmark: indexed lookup against the boolean scan + sort it replaces
+def benchmark(repos=500, days=90, lookups=200):
+    rng = np.random.default_rng(0)
+    names = [f"owner{i}/repo{i}" for i in range(repos)]
+    df = pd.DataFrame({
+        "repo_name": np.repeat(names, days),
+        "date_fetched": np.tile(pd.date_range("2024-10-07", periods=days, freq="D"), repos),
+        "stars": rng.integers(0, 1000, repos * days),
+    }).sample(frac=1, random_state=0)
+    targets = rng.choice(names, lookups)
+
+    build = timeit.timeit(lambda: RepoIndex(df), number=5) / 5
+    index = RepoIndex(df)
+    scan = timeit.timeit(lambda: [df[df["repo_name"] == repo].sort_values("date_fetched") for repo in targets], number=1)
+    indexed = timeit.timeit(lambda: [index.history(repo) for repo in targets], number=1)
+
+    print(f"{len(df)} rows, {lookups} lookups")
+    print(f"Index build:  {build * 1000:.1f} ms")
+    print(f"Scan + sort:  {scan / lookups * 1e6:.0f} us per lookup")
+    print(f"RepoIndex:    {indexed / lookups * 1e6:.0f} us per lookup")
+
+
+if __name__ == "__main__":
+    benchmark()
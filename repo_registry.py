@@ -0,0 +1,176 @@
+from datetime import datetime, timedelta
+
+from github_graphql import GRAPHQL_URL, RATE_LIMIT_FIELDS, aliased_repository_query
+from github_urls import normalize_github_url, parse_github_url
+
+# Repositories resolved per GraphQL request, and how long a URL that resolved to nothing
+# is skipped before we look again (in case the repo was only private for a while)
+RESOLVE_BATCH_SIZE = 100
+MISSING_RETRY_AFTER = timedelta(days=7)
+
+ACTIVE = "active"
+MISSING = "missing"
+
+REPO_IDENTITY_FIELDS = "id databaseId nameWithOwner"
+
+# Collections holding per-repo snapshots keyed by repo_name: every fetcher's registry
+# moves all of them on a rename, whichever fetcher happens to notice it first
+SNAPSHOT_COLLECTIONS = ("repo_stats", "repos")
+
+
+# Resolves each project URL once to GitHub's stable node id and canonical owner/name.
+# Known repos are re-checked by node id on every run, so renames and transfers are picked up
+# and their stored snapshots in `snapshot_collections` moved to the new name; URLs that
+# resolve to nothing are skipped.
+class RepoRegistry:
+    def __init__(self, collection, scheduler, token, snapshot_collections=()):
+        self.collection = collection
+        self.snapshot_collections = list(snapshot_collections)
+        self.scheduler = scheduler
+        self.headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("github_url", name="github_url", unique=True)
+        await self.collection.create_index("repo_id", name="repo_id")
+
+    # Active repos for the given projects as {repo_id, repo_name, project_name}, one per repository.
+    # A dry run looks repos up the same way but writes nothing back.
+    async def resolve(self, projects, session, dry_run=False):
+        entries = {entry["github_url"]: entry async for entry in self.collection.find({})}
+        now = datetime.utcnow()
+        unresolved = {}
+        known = {}
+        for project in projects:
+            github_url = normalize_github_url(project["github_url"])
+            if github_url is None:
+                print(f"Skipping {project['project_name']}: not a GitHub repository URL ({project['github_url']})")
+                continue
+            entry = entries.get(github_url)
+            if entry is None or (entry["status"] == MISSING and now - entry["resolved_at"] >= MISSING_RETRY_AFTER):
+                unresolved[github_url] = project
+            elif entry["status"] == ACTIVE:
+                known[github_url] = (entry, project)
+
+        # New URLs are looked up by owner/name; GitHub answers for renamed and transferred repos too
+        urls = list(unresolved)
+        for start in range(0, len(urls), RESOLVE_BATCH_SIZE):
+            batch = urls[start:start + RESOLVE_BATCH_SIZE]
+            found = await self._lookup_names([parse_github_url(github_url) for github_url in batch], session)
+            if found is None:
+                continue
+            for github_url, repo in zip(batch, found):
+                entries[github_url] = await self._register(github_url, unresolved[github_url], repo, dry_run=dry_run)
+
+        # Known repos are looked up by node id, which survives renames
+        urls = list(known)
+        for start in range(0, len(urls), RESOLVE_BATCH_SIZE):
+            batch = urls[start:start + RESOLVE_BATCH_SIZE]
+            found = await self._lookup_ids([known[github_url][0]["repo_id"] for github_url in batch], session)
+            if found is None:
+                continue
+            for github_url, repo in zip(batch, found):
+                entry, project = known[github_url]
+                if repo is None or repo["nameWithOwner"] != entry["repo_name"]:
+                    entries[github_url] = await self._register(github_url, project, repo, entry["repo_name"], dry_run)
+
+        active = {}
+        for project in projects:
+            entry = entries.get(normalize_github_url(project["github_url"]))
+            if entry and entry["status"] == ACTIVE and entry["repo_id"] not in active:
+                active[entry["repo_id"]] = {"repo_id": entry["repo_id"], "repo_name": entry["repo_name"], "project_name": project["project_name"]}
+        skipped = sum(1 for entry in entries.values() if entry["status"] == MISSING)
+        print(f"Resolved {len(active)} repositories, skipping {skipped} URLs that no longer resolve")
+        return list(active.values())
+
+    async def _register(self, github_url, project, repo, previous_name=None, dry_run=False):
+        now = datetime.utcnow()
+        if repo is None:
+            print(f"Repository not found for {project['project_name']} ({github_url}), skipping it")
+            entry = {"github_url": github_url, "status": MISSING, "resolved_at": now}
+            if not dry_run:
+                await self.collection.update_one({"github_url": github_url}, {"$set": entry}, upsert=True)
+            return entry
+
+        entry = {
+            "github_url": github_url,
+            "status": ACTIVE,
+            "repo_id": repo["id"],
+            "database_id": repo["databaseId"],
+            "repo_name": repo["nameWithOwner"],
+            "resolved_at": now,
+        }
+        # Names earlier snapshots may have been stored under: the previous canonical name,
+        # or the owner/name taken from the URL (with or without a .git suffix)
+        owner, name = parse_github_url(github_url)
+        old_names = {f"{owner}/{name}", f"{owner}/{name}.git"}
+        if previous_name:
+            old_names.add(previous_name)
+        old_names.discard(entry["repo_name"])
+
+        update = {"$set": entry}
+        if previous_name and previous_name != entry["repo_name"]:
+            print(f"Repository {previous_name} is now {entry['repo_name']}")
+            update["$addToSet"] = {"previous_names": previous_name}
+        if dry_run:
+            return entry
+        await self.collection.update_one({"github_url": github_url}, update, upsert=True)
+        for collection in self.snapshot_collections:
+            renamed = await rename_snapshots(collection, sorted(old_names), entry["repo_name"], entry["repo_id"])
+            if renamed:
+                print(f"Moved {renamed} {collection.name} snapshots to {entry['repo_name']}")
+        return entry
+
+    async def _lookup_names(self, owner_names, session):
+        query, variables = aliased_repository_query(owner_names, REPO_IDENTITY_FIELDS)
+        data = await self._query(query, variables, session)
+        return None if data is None else [data.get(f"r{i}") for i in range(len(owner_names))]
+
+    async def _lookup_ids(self, repo_ids, session):
+        query = (
+            "query ($ids: [ID!]!) {\n"
+            f"  nodes(ids: $ids) {{ ... on Repository {{ {REPO_IDENTITY_FIELDS} }} }}\n"
+            f"  {RATE_LIMIT_FIELDS}\n}}"
+        )
+        data = await self._query(query, {"ids": repo_ids}, session)
+        return None if data is None else data["nodes"]
+
+    # Data of a GraphQL response; missing repositories come back as null alongside an error entry
+    async def _query(self, query, variables, session):
+        response = await self.scheduler.request(session, "POST", GRAPHQL_URL, json={"query": query, "variables": variables}, headers=self.headers)
+        result = response.data if response.status == 200 else None
+        if result is None or not result.get("data"):
+            reason = f"status: {response.status}" if result is None else result.get("errors")
+            print(f"Failed to resolve repositories, {reason}")
+            return None
+        return result["data"]
+
+
+# Move snapshots stored under old names to the canonical name and tag all of them with the repo id.
+# Days that already have a snapshot under the new name keep that one. Moved snapshots get a
+# renamed_at, since their date_fetched stays put (see snapshot_queries.snapshots_version);
+# returns how many were moved.
+async def rename_snapshots(collection, old_names, repo_name, repo_id):
+    renamed = 0
+    if old_names:
+        taken = await collection.distinct("snapshot_date", {"repo_name": repo_name})
+        result = await collection.update_many(
+            {"repo_name": {"$in": old_names}, "snapshot_date": {"$nin": taken}},
+            {"$set": {"repo_name": repo_name, "repo_id": repo_id, "renamed_at": datetime.utcnow()}},
+        )
+        renamed = result.modified_count
+    await collection.update_many(
+        {"repo_name": repo_name, "repo_id": {"$ne": repo_id}},
+        {"$set": {"repo_id": repo_id}},
+    )
+    return renamed
+
+
+# Wrap a stream_snapshots fetch function so every snapshot carries its registry repo id
+def with_repo_ids(fetch, repo_ids):
+    async def fetch_with_ids(*item):
+        result = await fetch(*item)
+        for repo_data in result if isinstance(result, list) else [result]:
+            if repo_data and repo_data["repo_name"] in repo_ids:
+                repo_data["repo_id"] = repo_ids[repo_data["repo_name"]]
+        return result
+    return fetch_with_ids
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+# Metrics that carry 70% of every composite score; the rest is split across the low-weight ones
+HIGH_WEIGHT_METRICS = ["forks", "contributors", "closed_prs"]
+HIGH_WEIGHT_SHARE = 0.7
+
+
+# Weights giving `high` metrics `high_share` of the score and `low` metrics the remainder, split evenly
+def tiered_weights(low, high=HIGH_WEIGHT_METRICS, high_share=HIGH_WEIGHT_SHARE):
+    weights = {metric: high_share / len(high) for metric in high}
+    weights.update({metric: (1 - high_share) / len(low) for metric in low})
+    return weights
+
+
+# Calendar day of each snapshot, for ranking repos against others fetched the same day
+def snapshot_days(df):
+    return df["date_fetched"].dt.floor("D")
+
+
+# Percentile rank of each column, within each `by` group when given
+def percentile_ranks(df, columns, by=None):
+    if by is None:
+        return df[columns].rank(pct=True)
+    return df[columns].groupby(by).rank(pct=True)
+
+
+# Weighted sum of percentile ranks; `suffix` selects e.g. the "_gain" columns of each metric
+def composite_score(df, weights, by=None, suffix=""):
+    columns = [f"{metric}{suffix}" for metric in weights]
+    ranks = percentile_ranks(df, columns, by).to_numpy(dtype=float)
+    return pd.Series(ranks @ np.fromiter(weights.values(), dtype=float), index=df.index)
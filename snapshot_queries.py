@@ -0,0 +1,121 @@
+import pandas as pd
+from datetime import timedelta
+
+from snapshot_store import METRICS
+
+# Only the fields the dashboards use; _id and project_name never leave MongoDB
+SNAPSHOT_COLUMNS = ["repo_name", "date_fetched"] + METRICS
+
+
+# Snapshots as a DataFrame, optionally limited to a date window, to those fetched
+# strictly after a given time, or to a single repo
+def find_snapshots(collection, start=None, end=None, repo_name=None, after=None):
+    query = {}
+    if start is not None or end is not None or after is not None:
+        query["date_fetched"] = {}
+        if start is not None:
+            query["date_fetched"]["$gte"] = start
+        if after is not None:
+            query["date_fetched"]["$gt"] = after
+        if end is not None:
+            query["date_fetched"]["$lt"] = end
+    if repo_name is not None:
+        query["repo_name"] = repo_name
+    projection = {"_id": 0, **{column: 1 for column in SNAPSHOT_COLUMNS}}
+    cursor = collection.find(query, projection).sort("date_fetched", 1)
+    return pd.DataFrame(list(cursor), columns=SNAPSHOT_COLUMNS)
+
+
+# Smallest in-memory form of a snapshot frame: no _id, categorical names and each count metric
+# downcast to the smallest integer dtype that holds it (metrics with gaps stay floating point)
+def compact_snapshots(df, report=True):
+    before = df.memory_usage(deep=True).sum()
+    df = df.drop(columns=["_id"], errors="ignore")
+    compact = {}
+    for column in ["repo_name", "project_name"]:
+        if column in df:
+            compact[column] = df[column].astype("category").cat.remove_unused_categories()
+    for metric in METRICS:
+        if metric in df and df[metric].notna().all():
+            compact[metric] = pd.to_numeric(df[metric], downcast="integer")
+    df = df.assign(**compact)
+    if report:
+        after = df.memory_usage(deep=True).sum()
+        print(f"Snapshot frame: {len(df)} rows, {before / 2**20:.1f} MB -> {after / 2**20:.1f} MB")
+    return df
+
+
+def latest_fetch_date(collection):
+    latest = collection.find_one({}, {"_id": 0, "date_fetched": 1}, sort=[("date_fetched", -1)])
+    return latest["date_fetched"] if latest else None
+
+
+# Changes whenever a rename has moved stored snapshots: the latest renamed_at among them
+def snapshots_version(collection):
+    latest = collection.find_one({"renamed_at": {"$exists": True}}, {"_id": 0, "renamed_at": 1}, sort=[("renamed_at", -1)])
+    return latest["renamed_at"].isoformat() if latest else None
+
+
+# Snapshots with every metric; partial ones (a failed sub-fetch) would make $first/$last return null
+COMPLETE_SNAPSHOT = {metric: {"$ne": None} for metric in METRICS}
+
+
+# First or last complete snapshot per repo within `match`, grouped on the server
+def group_snapshots(collection, match, accumulator):
+    pipeline = [
+        {"$match": {**match, **COMPLETE_SNAPSHOT}},
+        {"$sort": {"date_fetched": 1}},
+        {"$group": {
+            "_id": "$repo_name",
+            "date_fetched": {accumulator: "$date_fetched"},
+            **{metric: {accumulator: f"${metric}"} for metric in METRICS},
+        }},
+    ]
+    rows = list(collection.aggregate(pipeline, allowDiskUse=True))
+    df = pd.DataFrame(rows, columns=["_id", "date_fetched"] + METRICS)
+    return df.rename(columns={"_id": "repo_name"}).set_index("repo_name")
+
+
+# Day windows used by the leaderboard, counted in whole days since the reference date
+def gain_windows(latest_date, reference_date):
+    max_days = (latest_date - reference_date).days
+    day_ago_start = reference_date + timedelta(days=max_days - 1)
+    return {
+        "day_ago": (day_ago_start, day_ago_start + timedelta(days=1)),
+        "week_ago": (reference_date + timedelta(days=max_days - 7), None),
+    }
+
+
+# Per-repo latest, earliest, day-ago and week-ago rows needed for gain calculations
+def load_gain_frames(collection, reference_date):
+    latest_date = latest_fetch_date(collection)
+    if latest_date is None:
+        empty = pd.DataFrame(columns=["date_fetched"] + METRICS, index=pd.Index([], name="repo_name"))
+        return {"latest": empty, "earliest": empty, "day_ago": empty, "week_ago": empty}
+
+    windows = gain_windows(latest_date, reference_date)
+    day_start, day_end = windows["day_ago"]
+    week_start, _ = windows["week_ago"]
+    return {
+        "latest": group_snapshots(collection, {}, "$last"),
+        "earliest": group_snapshots(collection, {}, "$first"),
+        "day_ago": group_snapshots(collection, {"date_fetched": {"$gte": day_start, "$lt": day_end}}, "$last"),
+        "week_ago": group_snapshots(collection, {"date_fetched": {"$gte": week_start}}, "$first"),
+    }
+
+
+# The same frames computed from an already loaded snapshot DataFrame (e.g. read from Parquet)
+def gain_frames_from_df(df, reference_date):
+    windows = gain_windows(df["date_fetched"].max(), reference_date)
+    df = df.dropna(subset=METRICS).sort_values("date_fetched")
+    columns = ["date_fetched"] + METRICS
+    day_start, day_end = windows["day_ago"]
+    week_start, _ = windows["week_ago"]
+    day_ago = df[(df["date_fetched"] >= day_start) & (df["date_fetched"] < day_end)]
+    week_ago = df[df["date_fetched"] >= week_start]
+    return {
+        "latest": df.groupby("repo_name", observed=True)[columns].last(),
+        "earliest": df.groupby("repo_name", observed=True)[columns].first(),
+        "day_ago": day_ago.groupby("repo_name", observed=True)[columns].last(),
+        "week_ago": week_ago.groupby("repo_name", observed=True)[columns].first(),
+    }
@@ -0,0 +1,158 @@
+import os
+import time
+import asyncio
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.write_concern import WriteConcern
+
+# Count metrics stored in every repo_stats snapshot
+METRICS = ["stars", "forks", "watchers", "contributors", "size", "open_issues", "closed_issues", "open_prs", "closed_prs"]
+
+# Number of snapshots sent to MongoDB per bulk_write call
+WRITE_BATCH_SIZE = int(os.getenv("MONGO_WRITE_BATCH_SIZE", 500))
+
+# Streaming pipeline: fetch workers, snapshots per streamed write, and how long the oldest
+# snapshot of a partial batch may wait before the batch is written
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", 8))
+STREAM_BATCH_SIZE = int(os.getenv("MONGO_STREAM_BATCH_SIZE", 25))
+FLUSH_INTERVAL = 5
+
+# Snapshots are idempotent upserts keyed by repo and day, so a re-run repairs any
+# lost write; primary acknowledgement without waiting for the journal is enough.
+SNAPSHOT_WRITE_CONCERN = WriteConcern(w=1, j=False)
+
+
+# Day a snapshot belongs to, stored alongside the full fetch timestamp
+def snapshot_day(fetched_at):
+    return fetched_at.strftime("%Y-%m-%d")
+
+
+# One snapshot per repo per day; older documents without snapshot_date are left out of the index.
+# Snapshots of registered repos are also unique per stable repo_id, which survives renames.
+# The date indexes serve the dashboards' date-window and per-repo history queries,
+# renamed_at their check for snapshots moved by a rename.
+async def ensure_snapshot_indexes(collection, date_field="date_fetched"):
+    await collection.create_index(
+        [("repo_name", ASCENDING), ("snapshot_date", ASCENDING)],
+        name="repo_name_snapshot_date",
+        unique=True,
+        partialFilterExpression={"snapshot_date": {"$exists": True}},
+    )
+    await collection.create_index(
+        [("repo_id", ASCENDING), ("snapshot_date", ASCENDING)],
+        name="repo_id_snapshot_date",
+        unique=True,
+        partialFilterExpression={"repo_id": {"$exists": True}, "snapshot_date": {"$exists": True}},
+    )
+    await collection.create_index(date_field, name=date_field)
+    await collection.create_index([("repo_name", ASCENDING), (date_field, ASCENDING)], name=f"repo_name_{date_field}")
+    await collection.create_index("renamed_at", name="renamed_at", sparse=True)
+
+
+# Upsert keyed by the registry's repo_id when the snapshot has one, by repo_name otherwise
+def snapshot_upsert(repo_data, date_field):
+    repo_data["snapshot_date"] = snapshot_day(repo_data[date_field])
+    key = "repo_id" if "repo_id" in repo_data else "repo_name"
+    return UpdateOne(
+        {key: repo_data[key], "snapshot_date": repo_data["snapshot_date"]},
+        {"$set": repo_data},
+        upsert=True,
+    )
+
+
+# Upsert snapshots with unordered bulk writes, returning how many documents were written
+async def save_snapshots(collection, repo_data_list, date_field="date_fetched", batch_size=WRITE_BATCH_SIZE):
+    collection = collection.with_options(write_concern=SNAPSHOT_WRITE_CONCERN)
+    saved = 0
+    for start in range(0, len(repo_data_list), batch_size):
+        requests = [snapshot_upsert(repo_data, date_field) for repo_data in repo_data_list[start:start + batch_size]]
+        try:
+            result = await collection.bulk_write(requests, ordered=False)
+            saved += result.upserted_count + result.matched_count
+        except BulkWriteError as e:
+            details = e.details
+            saved += details.get("nUpserted", 0) + details.get("nMatched", 0)
+            for error in details.get("writeErrors", []):
+                print(f"Failed to save snapshot: {error.get('errmsg')}")
+    return saved
+
+
+# Streams snapshots into MongoDB as they arrive. The queue is bounded, so fetch
+# workers wait whenever writes fall behind, and pending snapshots are flushed on
+# exit even when the run fails part-way.
+class SnapshotWriter:
+    def __init__(self, collection, date_field="date_fetched", batch_size=STREAM_BATCH_SIZE, max_queued=None,
+                 flush_interval=FLUSH_INTERVAL, on_flush=None):
+        self.collection = collection
+        self.on_flush = on_flush
+        self.date_field = date_field
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = asyncio.Queue(maxsize=max_queued or batch_size * 2)
+        self.saved = 0
+        self.task = None
+
+    async def __aenter__(self):
+        self.task = asyncio.create_task(self._consume())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if not self.task.done():
+            await self.queue.put(None)
+        await self.task
+
+    async def put(self, repo_data):
+        if self.task.done():
+            self.task.result()  # Surface the writer's failure instead of blocking on a full queue
+        await self.queue.put(repo_data)
+
+    async def _consume(self):
+        batch = []
+        batch_started = None
+        while True:
+            # The deadline runs from the batch's first snapshot, so a steady trickle of
+            # results cannot keep postponing the write
+            timeout = None if batch_started is None else max(0, batch_started + self.flush_interval - time.monotonic())
+            try:
+                repo_data = await asyncio.wait_for(self.queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                await self._flush(batch)
+                batch_started = None
+                continue
+            if repo_data is None:
+                break
+            if not batch:
+                batch_started = time.monotonic()
+            batch.append(repo_data)
+            if len(batch) >= self.batch_size or time.monotonic() - batch_started >= self.flush_interval:
+                await self._flush(batch)
+                batch_started = None
+        await self._flush(batch)
+
+    async def _flush(self, batch):
+        if not batch:
+            return
+        self.saved += await save_snapshots(self.collection, batch, self.date_field, self.batch_size)
+        print(f"Saved data for {len(batch)} repositories")
+        if self.on_flush:
+            await self.on_flush(list(batch))
+        batch.clear()
+
+
+# Run `fetch(*item)` over items with a fixed pool of workers, streaming every
+# returned snapshot (or list of snapshots) into the writer as soon as it is ready
+async def stream_snapshots(items, fetch, writer, workers=FETCH_WORKERS):
+    pending = iter(items)
+
+    async def worker():
+        for item in pending:
+            try:
+                result = await fetch(*item)
+            except Exception as e:
+                print(f"Failed to fetch data for {item[0]}: {e!r}")
+                continue
+            for repo_data in result if isinstance(result, list) else [result]:
+                if repo_data:
+                    await writer.put(repo_data)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
@@ -0,0 +1,71 @@
+import math
+import numpy as np
+import streamlit as st
+from plotly.subplots import make_subplots
+import plotly.graph_objects as go
+
+# Most points drawn per metric line; longer histories are downsampled with LTTB
+TIMELINE_MAX_POINTS = 400
+TIMELINE_COLUMNS = 2
+
+
+# Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the visual shape of (x, y).
+# The first and last points are always kept; each bucket in between keeps the point forming the
+# largest triangle with the previously kept point and the average of the next bucket.
+def lttb_indices(x, y, threshold):
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    indices = np.empty(threshold, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.nanargmax(areas)) if not np.isnan(areas).all() else start
+        indices[i + 1] = previous
+    return indices
+
+
+# One figure with a subplot per metric, each line downsampled to at most `max_points`
+def timeline_figure(project_df, metrics, max_points=TIMELINE_MAX_POINTS):
+    project_df = project_df.sort_values("date_fetched")
+    dates = project_df["date_fetched"].to_numpy()
+    timestamps = dates.astype("datetime64[ns]").astype("int64")
+
+    rows = math.ceil(len(metrics) / TIMELINE_COLUMNS)
+    fig = make_subplots(
+        rows=rows,
+        cols=TIMELINE_COLUMNS,
+        subplot_titles=[f"{metric.capitalize()} over Time" for metric in metrics],
+        shared_xaxes=True,
+        vertical_spacing=0.3 / rows,
+    )
+    for i, metric in enumerate(metrics):
+        values = project_df[metric].to_numpy(dtype=float)
+        keep = lttb_indices(timestamps, values, max_points)
+        fig.add_trace(
+            go.Scatter(x=dates[keep], y=values[keep], mode="lines", name=metric.capitalize()),
+            row=i // TIMELINE_COLUMNS + 1,
+            col=i % TIMELINE_COLUMNS + 1,
+        )
+    fig.update_layout(height=250 * rows, showlegend=False, margin=dict(t=40))
+    return fig
+
+
+# Trends for one repo, built and sent to the browser only once the viewer asks for them
+def render_timeline(project_df, metrics, key, title="Trends over Time"):
+    st.subheader(title)
+    if st.toggle("Show charts", key=f"show_timeline_{key}"):
+        st.plotly_chart(timeline_figure(project_df, metrics), use_container_width=True)